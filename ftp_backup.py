@@ -1,7 +1,6 @@
 import os
 import shutil
 import json
-import zipfile
 from datetime import datetime
 import socket
 import re
@@ -11,6 +10,26 @@ import sublime
 import sublime_plugin
 import urllib.parse
 import time
+import hashlib
+import tempfile
+
+# Общий движок архивации
+try:
+    from . import ftp_backup_archive
+except ImportError:
+    import ftp_backup_archive
+
+# Каталог бэкапов (индекс задач), полнотекстовый индекс содержимого, события веб-интерфейса и метрики
+try:
+    from . import ftp_backup_catalog
+    from . import ftp_backup_fulltext
+    from . import ftp_backup_events
+    from . import ftp_backup_metrics
+except ImportError:
+    import ftp_backup_catalog
+    import ftp_backup_fulltext
+    import ftp_backup_events
+    import ftp_backup_metrics
 
 # Глобальные переменные для хранения текущего номера задачи и текущего сервера
 CURRENT_TASK_NUMBER = None
@@ -69,8 +88,10 @@ class FtpBackupManager:
         ]
         
         os.makedirs(backup_root, exist_ok=True)
-        self._load_config()
+        with ftp_backup_metrics.timer('ftp_backup_backup_phase_seconds', phase='config_load'):
+            self._load_config()
         self._load_folder_mapping()
+        self.catalog = ftp_backup_catalog.get_catalog(backup_root)
         
         self.logger.debug(f"Инициализация FtpBackupManager. Корневая папка: {backup_root}")
 
@@ -226,6 +247,7 @@ class FtpBackupManager:
         """
         Извлечение имени сайта из пути к файлу.
         Теперь всегда запрашивает имя проекта у пользователя.
+        prompt_if_failed=False: без сохраненного имени возвращает None, не показывая запрос
         """
         try:
             # Проверяем, есть ли уже сохраненное имя сайта для этого пути
@@ -233,6 +255,8 @@ class FtpBackupManager:
             if saved_site:
                 self.logger.debug(f"Используется сохраненное имя проекта: {saved_site}")
                 return saved_site
+            if not prompt_if_failed:
+                return None
             
             # Пытаемся извлечь имя сайта из пути для предложения пользователю
             suggested_name = None
@@ -410,7 +434,8 @@ class FtpBackupManager:
                     return None, None, None
                 
                 # Обнаруживаем переименованные папки и обновляем сопоставление
-                self._detect_renamed_folders()
+                with ftp_backup_metrics.timer('ftp_backup_backup_phase_seconds', phase='rename_detection'):
+                    self._detect_renamed_folders()
                 
                 # Получаем имя проекта из параметра или из сохраненного соответствия
                 site_name = server_name
@@ -504,7 +529,9 @@ class FtpBackupManager:
                         sublime.status_message(f"FTP Backup: Недостаточно прав для перезаписи файла: {os.path.basename(backup_path)}. Операция отменена.")
                         return False  # Указываем, что операция не удалась
                     
-                    shutil.copy2(file_path, backup_path)
+                    is_new_file = not os.path.exists(backup_path)
+                    with ftp_backup_metrics.timer('ftp_backup_backup_phase_seconds', phase='copy'):
+                        shutil.copy2(file_path, backup_path)
                     self.logger.debug(f"Создан/перезаписан бэкап в {backup_path}")
                     if relative_path not in self.server_backup_map:
                         self.server_backup_map[relative_path] = {
@@ -515,6 +542,49 @@ class FtpBackupManager:
                     self.server_backup_map[relative_path]['last_backup_time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                     self.server_backup_map[relative_path]['site'] = site_name
                     self._save_config()
+
+                    # Обновляем индексы каталога, чтобы список задач и версии файла строились без обхода папок
+                    kind = 'before' if backup_path.startswith(before_path) else 'after'
+                    backup_stat = os.stat(backup_path)
+                    ftp_backup_metrics.inc('ftp_backup_backups_total', kind=kind)
+                    ftp_backup_metrics.inc('ftp_backup_bytes_copied_total', backup_stat.st_size)
+                    if task_number:
+                        self.catalog.record_task_file(server_key, task_number, task_folder, is_new_file, backup_stat.st_mtime)
+                    with ftp_backup_metrics.timer('ftp_backup_backup_phase_seconds', phase='hash'):
+                        backup_hash = ftp_backup_catalog.hash_file(backup_path)
+                    self.catalog.record_version(relative_path, {
+                        'path': backup_path,
+                        'site': server_key,
+                        'task': task_number or '',
+                        'kind': kind,
+                        'time': backup_stat.st_mtime,
+                        'size': backup_stat.st_size,
+                        'hash': backup_hash
+                    })
+                    self.catalog.record_recent(relative_path, self.server_backup_map[relative_path])
+                    self.catalog.schedule_save()
+
+                    # Уведомляем открытые вкладки веб-интерфейса: новая копия и изменение статистики
+                    ftp_backup_events.publish('backup', {
+                        'relative_path': relative_path,
+                        'path': backup_path,
+                        'site': server_key,
+                        'task': task_number or '',
+                        'kind': kind,
+                        'size': backup_stat.st_size,
+                        'last_backup_time': self.server_backup_map[relative_path]['last_backup_time']
+                    })
+                    stats = self.catalog.get_statistics()
+                    if stats is not None:
+                        ftp_backup_events.publish('stats', ftp_backup_catalog.summarize_stats(stats))
+
+                    # Полнотекстовый индекс (если включен) обновляется в фоне
+                    ftp_backup_fulltext.schedule_content_indexing(self.backup_root, backup_path, {
+                        'site': server_key,
+                        'task': task_number or '',
+                        'kind': kind,
+                        'relative_path': relative_path
+                    })
                     return True  # Указываем, что операция удалась
 
                 if mode == 'before':
@@ -608,123 +678,104 @@ class FtpBackupManager:
     def _save_config(self):
         """Сохранение конфигурации с расширенной отладкой"""
         try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.server_backup_map, f, indent=4, ensure_ascii=False)
+            with ftp_backup_metrics.timer('ftp_backup_backup_phase_seconds', phase='config_save'):
+                with open(self.config_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.server_backup_map, f, indent=4, ensure_ascii=False)
             self.logger.debug(f"Конфигурация сохранена: {len(self.server_backup_map)} записей")
         except Exception as e:
             self.logger.error(f"Ошибка сохранения конфигурации: {e}")
 
-    def create_backup_zip(self, folder_path, folder_type=None):
+    def create_backup_zip(self, folder_path, folder_type=None, archive_format='zip', policy=None, progress=None):
         """
-        Создание ZIP-архива указанной папки бэкапа
+        Создание архива указанной папки бэкапа через общий движок ftp_backup_archive
         folder_path: путь к папке с бэкапами
         folder_type: 'before', 'after' или None (полная папка)
+        archive_format: 'zip', 'tar.gz' или 'tar.xz'
+        Возвращает путь к архиву (к первому тому при разбиении на тома)
         """
         try:
-            if not os.path.exists(folder_path):
-                self.logger.error(f"Папка для архивации не существует: {folder_path}")
-                return None
-            
-            # Приводим путь к стандартному виду
-            folder_path = os.path.normpath(folder_path)
-            
-            # Извлекаем имя сайта безопасным способом
-            folder_parts = folder_path.split(os.sep)
-            # Удаляем пустые элементы
-            folder_parts = [part for part in folder_parts if part]
-            
-            # Находим имя сайта - ищем часть после корневой папки бэкапов
-            site_name = "backup"  # значение по умолчанию
-            
-            # Ищем в пути индекс корневой директории бэкапов
-            backup_root_parts = os.path.normpath(self.backup_root).split(os.sep)
-            backup_root_parts = [part for part in backup_root_parts if part]
-            
-            # Находим индекс корневого каталога BackUp в пути
-            root_index = -1
-            for i, part in enumerate(folder_parts):
-                if i < len(folder_parts) - 1 and part == backup_root_parts[-1]:
-                    root_index = i
-                    break
-            
-            # Если нашли корневой каталог, то следующий элемент должен быть именем сайта
-            if root_index >= 0 and root_index + 1 < len(folder_parts):
-                site_name = folder_parts[root_index + 1]
-                self.logger.debug(f"Извлечено имя сайта из пути: {site_name}")
-                
-                # Проверяем, есть ли сопоставление с реальным именем сайта в folder_mapping
-                for real_site_name, folder_key in self.folder_mapping.items():
-                    if folder_key == site_name:
-                        site_name = real_site_name
-                        self.logger.debug(f"Найдено соответствие с реальным именем сайта: {site_name}")
-                        break
-            
-            # Формируем дату и время для имени файла
-            date_str = datetime.now().strftime("%d.%m.%Y.%H.%M")
-            
-            # Формируем имя ZIP архива
-            if folder_type:
-                zip_name = f"backup_{site_name}_{folder_type}_{date_str}.zip"
-            else:
-                zip_name = f"backup_{site_name}_{date_str}.zip"
-            
-            # Определяем папку задачи (task_xxx) или использовать исходную директорию
-            zip_dir = folder_path
-            
-            # Проверяем, может ли текущая папка быть 'before' или 'after' внутри задачи
-            current_folder = os.path.basename(folder_path)
-            if current_folder in ['before', 'after']:
-                # Поднимаемся на уровень выше - к папке задачи
-                zip_dir = os.path.dirname(folder_path)
-                self.logger.debug(f"Обнаружена папка {current_folder}, поднимаемся к папке задачи: {zip_dir}")
-            
-            # Ищем, содержит ли путь папку задачи
-            task_folder = None
-            for i, part in enumerate(folder_parts):
-                if part.startswith('task_') or re.match(r'task_[\w-]+', part):
-                    # Определяем полный путь до папки задачи
-                    task_index = i
-                    
-                    # Собираем путь до папки задачи включительно
-                    if ':' in folder_path:  # Windows путь
-                        drive = folder_path.split(':')[0] + ':'
-                        path_parts = folder_parts[:task_index+1]
-                        task_folder = os.path.join(drive, os.sep, *path_parts)
-                    else:  # Unix путь
-                        path_parts = folder_parts[:task_index+1]
-                        task_folder = os.path.join(os.sep, *path_parts)
-                    
-                    self.logger.debug(f"Найдена папка задачи: {task_folder}")
-                    break
-            
-            # Если нашли папку задачи, используем её
-            if task_folder:
-                zip_dir = task_folder
-                self.logger.debug(f"Установлена папка задачи для ZIP: {zip_dir}")
-            
-            # Формируем полный путь к ZIP
-            zip_path = os.path.join(zip_dir, zip_name)
-            
-            # Убеждаемся, что директория существует
-            os.makedirs(os.path.dirname(zip_path), exist_ok=True)
-            
-            self.logger.debug(f"Создание архива в папке задачи: {zip_path}")
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, dirs, files in os.walk(folder_path):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, folder_path)
-                        zipf.write(file_path, arcname)
-                        self.logger.debug(f"Добавлен файл {arcname}")
+            if policy is None:
+                policy = ftp_backup_archive.ArchivePolicy.from_settings()
+            
+            result = ftp_backup_archive.create_archive(
+                folder_path,
+                self.backup_root,
+                archive_format,
+                policy,
+                folder_type=folder_type,
+                folder_mapping=self.folder_mapping,
+                progress=progress,
+                logger=self.logger
+            )
             
-            self.logger.debug(f"Архив успешно создан: {zip_path}")
+            if policy.verify:
+                ftp_backup_archive.schedule_archive_verification(result.paths)
             
-            return zip_path
+            return result.paths[0] if result.paths else None
             
         except Exception as e:
             self.logger.error(f"Ошибка создания архива: {e}")
             return None
 
+    def create_restore_snapshot(self, file_path):
+        """
+        Копия текущего файла перед восстановлением версии: snapshots/<время>/<относительный путь>.
+        Папка snapshots служебная и не попадает в индексы задач и версий
+        Возвращает путь к снимку
+        """
+        snapshot_folder = os.path.join(self.backup_root, 'snapshots', datetime.now().strftime("%Y%m%d_%H%M%S"))
+        snapshot_path = os.path.join(snapshot_folder, self._extract_relative_path(file_path))
+        os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+        shutil.copy2(file_path, snapshot_path)
+        self.logger.debug(f"Снимок файла перед восстановлением: {snapshot_path}")
+        return snapshot_path
+
+    def restore_version(self, version_path, file_path):
+        """
+        Восстановление версии файла из бэкапа без преобразования содержимого:
+        сначала снимок текущего файла, затем копия версии пишется блоками во временный файл
+        рядом с целевым с подсчетом хэша, хэш сверяется с каталогом, и временный файл
+        атомарно заменяет целевой. При несовпадении хэша файл не изменяется
+        Возвращает {'snapshot_path', 'hash', 'verified', 'size'}, при ошибке выбрасывает исключение
+        """
+        version = self.catalog.find_version(version_path)
+        expected_hash = version.get('hash') if version else None
+
+        snapshot_path = self.create_restore_snapshot(file_path) if os.path.exists(file_path) else None
+
+        target_dir = os.path.dirname(os.path.abspath(file_path))
+        os.makedirs(target_dir, exist_ok=True)
+        digest = hashlib.sha1()
+        size = 0
+        tmp_file = tempfile.NamedTemporaryFile(dir=target_dir, prefix='.ftp_backup_restore_', suffix='.tmp', delete=False)
+        try:
+            with tmp_file, open(version_path, 'rb') as source:
+                for chunk in iter(lambda: source.read(ftp_backup_catalog.HASH_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    tmp_file.write(chunk)
+                    size += len(chunk)
+
+            actual_hash = digest.hexdigest()
+            if expected_hash and actual_hash != expected_hash:
+                raise ValueError(f"Хэш копии не совпадает с каталогом (ожидался {expected_hash}, получен {actual_hash}): {version_path}")
+
+            # Права доступа целевого файла сохраняются
+            if os.path.exists(file_path):
+                shutil.copymode(file_path, tmp_file.name)
+            os.replace(tmp_file.name, file_path)
+        except Exception:
+            if os.path.exists(tmp_file.name):
+                os.remove(tmp_file.name)
+            raise
+
+        self.logger.debug(f"Версия {version_path} восстановлена в {file_path} ({size} байт)")
+        return {
+            'snapshot_path': snapshot_path,
+            'hash': actual_hash,
+            'verified': bool(expected_hash),
+            'size': size
+        }
+
 class SaveCommand(sublime_plugin.TextCommand):
     """Перекрытие стандартной команды save"""
     def run(self, edit, **kwargs):
@@ -1336,12 +1387,20 @@ class FtpBackupCreateAfterCommand(sublime_plugin.TextCommand):
             sublime.error_message(f"Ошибка создания 'after' бэкапа: {str(e)}")
 
 class FtpBackupCreateZipCommand(sublime_plugin.WindowCommand):
-    def run(self):
-        """Создание ZIP-архива с выбором папки"""
+    def run(self, format=None):
+        """
+        Создание архива с выбором папки
+        format: 'zip', 'tar.gz', 'tar.xz' или None (значение настройки archive_format)
+        """
         # Загружаем путь к директории бэкапов из настроек
         settings = sublime.load_settings('ftp_backup.sublime-settings')
         backup_root = settings.get('backup_root')
-        
+
+        self.archive_format = format or settings.get('archive_format', 'zip')
+        if self.archive_format not in ftp_backup_archive.ARCHIVE_FORMATS:
+            sublime.error_message(f"Неизвестный формат архива: {self.archive_format}")
+            return
+
         try:
             # Получаем список сайтов (папок первого уровня)
             sites = [d for d in os.listdir(backup_root) 
@@ -1439,144 +1498,87 @@ class FtpBackupCreateZipCommand(sublime_plugin.WindowCommand):
         backup_root = settings.get('backup_root')
         backup_manager = FtpBackupManager(backup_root)
         
-        try:
-            zip_path = None
+        folder_path = None
+        folder_type = None
+        
+        # Парсим выбранную опцию
+        if selected.startswith('[Весь месяц]'):
+            # Архивируем всю папку месяца
+            folder_path = self.month_path
             
-            # Парсим выбранную опцию
-            if selected.startswith('[Весь месяц]'):
-                # Архивируем всю папку месяца
-                zip_path = self.create_zip_archive(backup_manager, self.month_path)
-                
-            elif selected.startswith('[Before]') or selected.startswith('[After]'):
-                folder_type = 'before' if selected.startswith('[Before]') else 'after'
-                
-                if selected.split('] ')[1] == self.month:
-                    # Архивируем корневую папку before/after
-                    folder_path = os.path.join(self.month_path, folder_type)
-                else:
-                    # Архивируем папку before/after задачи
-                    task_name = selected.split('] ')[1]
-                    folder_path = os.path.join(self.month_path, task_name, folder_type)
-                
-                zip_path = self.create_zip_archive(backup_manager, folder_path, folder_type)
-                
-            elif selected.startswith('[Задача]'):
-                # Архивируем всю папку задачи
+        elif selected.startswith('[Before]') or selected.startswith('[After]'):
+            folder_type = 'before' if selected.startswith('[Before]') else 'after'
+            
+            if selected.split('] ')[1] == self.month:
+                # Архивируем корневую папку before/after
+                folder_path = os.path.join(self.month_path, folder_type)
+            else:
+                # Архивируем папку before/after задачи
                 task_name = selected.split('] ')[1]
-                folder_path = os.path.join(self.month_path, task_name)
-                zip_path = self.create_zip_archive(backup_manager, folder_path)
+                folder_path = os.path.join(self.month_path, task_name, folder_type)
+            
+        elif selected.startswith('[Задача]'):
+            # Архивируем всю папку задачи
+            task_name = selected.split('] ')[1]
+            folder_path = os.path.join(self.month_path, task_name)
+        
+        if folder_path is None:
+            return
+        
+        # Архивация идет в фоне: основной поток не блокируется, и строка статуса показывает прогресс
+        archive_format = self.archive_format
+        sublime.status_message("FTP Backup: Архивация...")
+        sublime.set_timeout_async(lambda: self.run_archive(backup_manager, folder_path, folder_type, archive_format), 0)
+    
+    def run_archive(self, backup_manager, folder_path, folder_type, archive_format):
+        """Создает архив в фоновом потоке и сообщает результат в строке статуса"""
+        try:
+            zip_path = self.create_zip_archive(backup_manager, folder_path, folder_type, archive_format)
             
             # После создания архива, уведомляем пользователя
             if zip_path:
-                sublime.status_message(f"FTP Backup: Архив успешно создан по пути: {zip_path}")
+                message = f"FTP Backup: Архив успешно создан по пути: {zip_path}"
             else:
-                sublime.status_message("FTP Backup: Ошибка при создании архива")
+                message = "FTP Backup: Ошибка при создании архива"
+            sublime.set_timeout(lambda: sublime.status_message(message), 0)
         
         except Exception as e:
-            sublime.error_message(f"Ошибка при создании архива: {str(e)}")
+            error = f"Ошибка при создании архива: {str(e)}"
+            sublime.set_timeout(lambda: sublime.error_message(error), 0)
     
-    def create_zip_archive(self, backup_manager, folder_path, folder_type=None):
+    def create_zip_archive(self, backup_manager, folder_path, folder_type=None, archive_format='zip'):
         """
-        Создание ZIP-архива для указанной папки с сохранением в папке задачи
+        Создание архива (zip, tar.gz, tar.xz) для указанной папки с сохранением в папке задачи.
+        Выполняется в фоновом потоке (run_archive)
         """
         try:
             if not os.path.exists(folder_path):
-                sublime.status_message(f"FTP Backup: Папка для архивации не существует: {folder_path}")
+                message = f"FTP Backup: Папка для архивации не существует: {folder_path}"
+                sublime.set_timeout(lambda: sublime.status_message(message), 0)
                 return None
             
-            # Приводим путь к стандартному виду
-            folder_path = os.path.normpath(folder_path)
-            
-            # Извлекаем имя сайта безопасным способом
-            folder_parts = folder_path.split(os.sep)
-            # Удаляем пустые элементы
-            folder_parts = [part for part in folder_parts if part]
-            
-            # Находим имя сайта - ищем имя папки после корневой папки BackUp
-            site_name = "backup"  # значение по умолчанию
-            
-            # Ищем в пути индекс корневой директории бэкапов
-            backup_root_parts = os.path.normpath(self.backup_root).split(os.sep)
-            backup_root_parts = [part for part in backup_root_parts if part]
-            
-            # Находим индекс корневого каталога BackUp в пути
-            root_index = -1
-            for i, part in enumerate(folder_parts):
-                if i < len(folder_parts) - 1 and part == backup_root_parts[-1]:
-                    root_index = i
-                    break
-            
-            # Если нашли корневой каталог, то следующий элемент должен быть именем сайта
-            if root_index >= 0 and root_index + 1 < len(folder_parts):
-                site_name = folder_parts[root_index + 1]
-                backup_manager.logger.debug(f"Извлечено имя сайта из пути: {site_name}")
-                
-                # Проверяем, есть ли сопоставление с реальным именем сайта в folder_mapping
-                for real_site_name, folder_key in backup_manager.folder_mapping.items():
-                    if folder_key == site_name:
-                        site_name = real_site_name
-                        backup_manager.logger.debug(f"Найдено соответствие с реальным именем сайта: {site_name}")
-                        break
-            
-            # Формируем безопасное имя архива без недопустимых символов
-            date_str = datetime.now().strftime("%d.%m.%Y.%H.%M")
-            
-            # Определяем имя архива с учетом типа папки
-            if folder_type:
-                zip_name = f"backup_{site_name}_{folder_type}_{date_str}.zip"
-            else:
-                zip_name = f"backup_{site_name}_{date_str}.zip"
-            
-            # Определяем папку задачи (task_xxx) или использовать исходную директорию
-            zip_dir = folder_path
-            
-            # Проверяем, может ли текущая папка быть 'before' или 'after' внутри задачи
-            current_folder = os.path.basename(folder_path)
-            if current_folder in ['before', 'after']:
-                # Поднимаемся на уровень выше - к папке задачи
-                zip_dir = os.path.dirname(folder_path)
-                backup_manager.logger.debug(f"Обнаружена папка {current_folder}, поднимаемся к папке задачи: {zip_dir}")
-            
-            # Ищем, содержит ли путь папку задачи
-            task_folder = None
-            for i, part in enumerate(folder_parts):
-                if part.startswith('task_') or re.match(r'task_[\w-]+', part):
-                    # Определяем полный путь до папки задачи
-                    task_index = i
-                    
-                    # Собираем путь до папки задачи включительно
-                    if ':' in folder_path:  # Windows путь
-                        drive = folder_path.split(':')[0] + ':'
-                        path_parts = folder_parts[:task_index+1]
-                        task_folder = os.path.join(drive, os.sep, *path_parts)
-                    else:  # Unix путь
-                        path_parts = folder_parts[:task_index+1]
-                        task_folder = os.path.join(os.sep, *path_parts)
-                    
-                    backup_manager.logger.debug(f"Найдена папка задачи: {task_folder}")
-                    break
-            
-            # Если нашли папку задачи, используем её
-            if task_folder:
-                zip_dir = task_folder
-                backup_manager.logger.debug(f"Установлена папка задачи для ZIP: {zip_dir}")
-            
-            # Формируем полный путь к ZIP
-            zip_path = os.path.join(zip_dir, zip_name)
-            
-            # Убеждаемся, что директория существует
-            os.makedirs(os.path.dirname(zip_path), exist_ok=True)
+            policy = ftp_backup_archive.ArchivePolicy.from_settings()
+            result = ftp_backup_archive.create_archive(
+                folder_path,
+                self.backup_root,
+                archive_format,
+                policy,
+                folder_type=folder_type,
+                folder_mapping=backup_manager.folder_mapping,
+                progress=self.on_archive_progress,
+                logger=backup_manager.logger
+            )
+            if not result.paths:
+                return None
             
-            backup_manager.logger.debug(f"Создание архива в папке задачи: {zip_path}")
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, dirs, files in os.walk(folder_path):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, folder_path)
-                        zipf.write(file_path, arcname)
-                        backup_manager.logger.debug(f"Добавлен файл {arcname}")
+            if len(result.paths) > 1:
+                self.report_archive_parts(result)
+            elif archive_format != 'zip' and policy.compare_with_zip:
+                # Для tar-экспорта показываем сравнение с обычным ZIP
+                self.report_format_comparison(backup_manager, result, folder_path, policy.exclusions)
             
-            backup_manager.logger.debug(f"Архив успешно создан: {zip_path}")
+            if policy.verify:
+                sublime.set_timeout(lambda: ftp_backup_archive.schedule_archive_verification(result.paths, self.window), 0)
             
             # Сбрасываем текущий номер задачи после создания архива
             global CURRENT_TASK_NUMBER, CURRENT_SERVER
@@ -1584,8 +1586,51 @@ class FtpBackupCreateZipCommand(sublime_plugin.WindowCommand):
             CURRENT_SERVER = None
             backup_manager.logger.debug("Номер текущей задачи и сервер сброшены после создания архива")
             
-            return zip_path
+            return result.paths[0]
             
         except Exception as e:
             backup_manager.logger.error(f"Ошибка создания архива: {e}")
             return None
+
+    def on_archive_progress(self, file_count, source_bytes, arcname):
+        """Показывает прогресс архивации в строке статуса (вызывается из фонового потока)"""
+        if file_count % 100 == 0:
+            message = f"FTP Backup: Архивация... {file_count} файлов, {source_bytes // 1024} КБ"
+            sublime.set_timeout(lambda: sublime.status_message(message), 0)
+
+    def report_format_comparison(self, backup_manager, result, folder_path, exclusions):
+        """
+        Выводит в панель размер и время tar-экспорта в сравнении с ZIP той же папки.
+        Папка сжимается повторно, поэтому замер выполняется в фоне, а панель обновляется в основном потоке
+        """
+        def measure():
+            try:
+                lines = [
+                    f"Архив: {result.paths[0]}",
+                    f"Файлов: {result.file_count}",
+                    f"{result.archive_format}: {result.archive_bytes} байт, {result.elapsed:.2f} с"
+                ]
+
+                zip_size, zip_elapsed = ftp_backup_archive.measure_zip_size(folder_path, exclusions)
+                lines.append(f"zip: {zip_size} байт, {zip_elapsed:.2f} с")
+                if zip_size:
+                    ratio = result.archive_bytes / zip_size * 100
+                    lines.append(f"Размер {result.archive_format} относительно zip: {ratio:.1f}%")
+                sublime.set_timeout(lambda: self.show_archive_report(lines), 0)
+            except Exception as e:
+                backup_manager.logger.error(f"Ошибка сравнения форматов архива: {e}")
+
+        sublime.set_timeout_async(measure, 0)
+
+    def show_archive_report(self, lines):
+        """Выводит строки отчета об архиве в панель"""
+        panel = self.window.create_output_panel("ftp_backup_archive")
+        panel.run_command("append", {"characters": "\n".join(lines) + "\n", "scroll_to_end": True})
+        self.window.run_command("show_panel", {"panel": "output.ftp_backup_archive"})
+
+    def report_archive_parts(self, result):
+        """Выводит в панель список томов многотомного архива"""
+        lines = [f"Многотомный архив ({result.archive_format}): {len(result.paths)} томов, {result.file_count} файлов, {result.elapsed:.2f} с"]
+        for part_path in result.paths:
+            lines.append(f"{part_path}: {os.path.getsize(part_path)} байт")
+        sublime.set_timeout(lambda: self.show_archive_report(lines), 0)
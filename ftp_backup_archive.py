@@ -0,0 +1,542 @@
+import sublime
+import sublime_plugin
+import os
+import re
+import json
+import time
+import fnmatch
+import zipfile
+import tarfile
+import tempfile
+import shutil
+import threading
+import collections
+import concurrent.futures
+from datetime import datetime
+
+# Общий сканер папок бэкапов, события веб-интерфейса и метрики
+try:
+    from . import ftp_backup_scanner
+    from . import ftp_backup_events
+    from . import ftp_backup_metrics
+except ImportError:
+    import ftp_backup_scanner
+    import ftp_backup_events
+    import ftp_backup_metrics
+
+# Шаблоны, которые никогда не попадают в архив: ранее созданные архивы,
+# служебные папки плагина и временные файлы. Дополняются настройкой "archive_exclude".
+# Шаблон с начальным '/' действует только на верхнем уровне архивируемой папки:
+# папка logs сайта (site/app/logs) в архив попадает
+ARCHIVE_EXCLUDE_DEFAULTS = [
+    'backup_*.zip',
+    'backup_*.tar.gz',
+    'backup_*.tar.xz',
+    'backup_*.manifest.json',
+    '/logs',
+    '/reports',
+    '/snapshots',
+    '*.tmp',
+    '*.temp',
+    '*.part',
+    '*.swp',
+    '~$*',
+    '.DS_Store',
+    'Thumbs.db'
+]
+
+def compile_archive_exclusions(extra_patterns=None):
+    """
+    Компилирует набор исключений для архивации в два регулярных выражения:
+    для шаблонов без '/' (сравнение с именем на любой глубине) и с '/' (сравнение
+    с относительным путем от архивируемой папки, '/logs' - только папка верхнего уровня)
+    """
+    name_patterns = []
+    path_patterns = []
+    for pattern in list(ARCHIVE_EXCLUDE_DEFAULTS) + list(extra_patterns or []):
+        pattern = pattern.strip().replace('\\', '/')
+        anchored = pattern.startswith('/')
+        pattern = pattern.strip('/')
+        if not pattern:
+            continue
+        if anchored or '/' in pattern:
+            path_patterns.append(fnmatch.translate(pattern))
+        else:
+            name_patterns.append(fnmatch.translate(pattern))
+
+    name_re = re.compile('|'.join(name_patterns), re.IGNORECASE) if name_patterns else None
+    path_re = re.compile('|'.join(path_patterns), re.IGNORECASE) if path_patterns else None
+    return name_re, path_re
+
+def iter_archive_files(folder_path, exclusions=None):
+    """
+    Обходит папку общим сканером и возвращает пары (полный путь, имя в архиве).
+    Исключенные папки отсекаются целиком, без спуска внутрь
+    """
+    for file_path, arcname, _ in iter_archive_entries(folder_path, exclusions):
+        yield file_path, arcname
+
+def iter_archive_entries(folder_path, exclusions=None):
+    """
+    То же, что iter_archive_files, но возвращает тройки (полный путь, имя в архиве, размер).
+    Размер берется из stat, закэшированного в DirEntry
+    """
+    if exclusions is None:
+        exclusions = compile_archive_exclusions()
+    name_re, path_re = exclusions
+
+    def is_excluded(name, relpath):
+        if name_re is not None and name_re.match(name):
+            return True
+        return path_re is not None and path_re.match(relpath) is not None
+
+    for record in ftp_backup_scanner.iter_files(folder_path, exclude=is_excluded, sort=True):
+        yield record.path, record.relpath, record.size
+
+def load_archive_exclusions():
+    """Загружает пользовательские шаблоны исключений из настроек и компилирует их"""
+    settings = sublime.load_settings('ftp_backup.sublime-settings')
+    return compile_archive_exclusions(settings.get('archive_exclude', []))
+
+# Поддерживаемые форматы архивов и расширения файлов
+ARCHIVE_FORMATS = {
+    'zip': '.zip',
+    'tar.gz': '.tar.gz',
+    'tar.xz': '.tar.xz'
+}
+
+def write_archive(archive_path, folder_path, archive_format='zip', exclusions=None, logger=None, progress=None):
+    """
+    Записывает содержимое папки в архив указанного формата.
+    tar.gz и tar.xz пишутся в потоковом режиме tarfile ('w|gz', 'w|xz'):
+    файлы читаются блоками, поэтому расход памяти не зависит от размера папки.
+    Возвращает количество добавленных файлов
+    """
+    return _write_archive_entries(archive_path, iter_archive_entries(folder_path, exclusions), archive_format, logger, progress)
+
+def _write_archive_entries(archive_path, entries, archive_format='zip', logger=None, progress=None):
+    """
+    Записывает тройки (полный путь, имя в архиве, размер) в один архив.
+    Рядом с архивом сохраняется манифест исходных файлов для последующей проверки.
+    progress(arcname, size) вызывается после добавления каждого файла.
+    Возвращает количество добавленных файлов
+    """
+    manifest = {}
+    if archive_format == 'zip':
+        with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for file_path, arcname, size in entries:
+                zipf.write(file_path, arcname)
+                manifest[arcname] = size
+                if logger:
+                    logger.debug(f"Добавлен файл {arcname}")
+                if progress:
+                    progress(arcname, size)
+    elif archive_format in ('tar.gz', 'tar.xz'):
+        mode = 'w|gz' if archive_format == 'tar.gz' else 'w|xz'
+        with open(archive_path, 'wb') as raw, tarfile.open(fileobj=raw, mode=mode) as tar:
+            for file_path, arcname, size in entries:
+                tar.add(file_path, arcname, recursive=False)
+                manifest[arcname] = size
+                if logger:
+                    logger.debug(f"Добавлен файл {arcname}")
+                if progress:
+                    progress(arcname, size)
+    else:
+        raise ValueError(f"Неизвестный формат архива: {archive_format}")
+
+    write_archive_manifest(archive_path, archive_format, manifest)
+    return len(manifest)
+
+def get_archive_manifest_path(archive_path):
+    """backup_site_date.zip -> backup_site_date.zip.manifest.json"""
+    return archive_path + '.manifest.json'
+
+def write_archive_manifest(archive_path, archive_format, files):
+    """Сохраняет манифест архива: имена файлов и их исходные размеры"""
+    manifest = {
+        'archive': os.path.basename(archive_path),
+        'format': archive_format,
+        'created': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'files': files
+    }
+    with open(get_archive_manifest_path(archive_path), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+def get_archive_part_path(archive_path, archive_format, part_number):
+    """backup_site_date.zip -> backup_site_date.part001.zip"""
+    extension = ARCHIVE_FORMATS[archive_format]
+    base = archive_path[:-len(extension)] if archive_path.endswith(extension) else archive_path
+    return f"{base}.part{part_number:03d}{extension}"
+
+def plan_archive_parts(entries, split_size):
+    """
+    Делит файлы на тома так, чтобы исходный размер каждого тома не превышал split_size.
+    Размер после сжатия заранее неизвестен, поэтому готовый том обычно меньше split_size.
+    Файл больше split_size попадает в отдельный том целиком: файлы не разрезаются,
+    поэтому каждый том - самостоятельный архив
+    """
+    parts = []
+    current = []
+    current_size = 0
+    for file_path, arcname, size in entries:
+        if current and current_size + size > split_size:
+            parts.append(current)
+            current = []
+            current_size = 0
+        current.append((file_path, arcname, size))
+        current_size += size
+    if current:
+        parts.append(current)
+    return parts
+
+def write_split_archive(archive_path, folder_path, archive_format='zip', exclusions=None, logger=None, split_size=0, max_workers=None, progress=None):
+    """
+    Создает многотомный архив: part001, part002, ... не больше split_size байт исходных данных.
+    Тома независимы друг от друга и пишутся параллельно в пуле потоков
+    (zlib и lzma освобождают GIL при сжатии).
+    Возвращает список пар (путь тома, количество файлов)
+    """
+    parts = plan_archive_parts(iter_archive_entries(folder_path, exclusions), split_size)
+    if not parts:
+        return []
+
+    part_paths = [get_archive_part_path(archive_path, archive_format, i) for i in range(1, len(parts) + 1)]
+    if max_workers is None:
+        max_workers = min(4, os.cpu_count() or 1)
+
+    # Тома пишутся из разных потоков, поэтому вызовы progress сериализуются
+    if progress:
+        progress_lock = threading.Lock()
+        user_progress = progress
+
+        def progress(arcname, size):
+            with progress_lock:
+                user_progress(arcname, size)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_write_archive_entries, part_path, part_entries, archive_format, logger, progress)
+            for part_path, part_entries in zip(part_paths, parts)
+        ]
+        counts = [future.result() for future in futures]
+
+    return list(zip(part_paths, counts))
+
+def schedule_archive_verification(archive_paths, window=None):
+    """Запускает фоновую проверку созданных архивов командой ftp_backup_verify_archive"""
+    if not archive_paths:
+        return
+    window = window or sublime.active_window()
+    if window:
+        window.run_command("ftp_backup_verify_archive", {"archive_paths": archive_paths, "quiet": True})
+
+def get_archive_split_size():
+    """Размер тома в байтах исходных данных из настройки archive_split_size_mb (0 - без разбиения)"""
+    settings = sublime.load_settings('ftp_backup.sublime-settings')
+    try:
+        return max(0, int(float(settings.get('archive_split_size_mb', 0)) * 1024 * 1024))
+    except (TypeError, ValueError):
+        return 0
+
+class _CountingSink:
+    """Поток-заглушка, который только считает записанные байты"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+def measure_zip_size(folder_path, exclusions=None):
+    """
+    Сжимает папку в ZIP без записи на диск и возвращает (размер, время в секундах).
+    Используется для сравнения размера и скорости tar-экспорта с обычным ZIP
+    (без seek zipfile добавляет к каждому файлу 16-байтный дескриптор данных)
+    """
+    sink = _CountingSink()
+    started = time.time()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for file_path, arcname in iter_archive_files(folder_path, exclusions):
+            zipf.write(file_path, arcname)
+    return sink.size, time.time() - started
+
+# Результат создания архива
+ArchiveResult = collections.namedtuple('ArchiveResult', [
+    'paths',           # пути созданных архивов (несколько при разбиении на тома)
+    'archive_format',  # 'zip', 'tar.gz' или 'tar.xz'
+    'file_count',      # количество файлов в архиве
+    'source_bytes',    # исходный размер файлов
+    'archive_bytes',   # размер архива (сумма томов)
+    'elapsed'          # время создания в секундах
+])
+
+class ArchivePolicy:
+    """Правила архивации: исключения, разбиение на тома, проверка после создания"""
+
+    def __init__(self, exclude=None, split_size=0, verify=True, compare_with_zip=False):
+        self.exclude = list(exclude or [])
+        self.split_size = split_size
+        self.verify = verify
+        self.compare_with_zip = compare_with_zip
+        self.exclusions = compile_archive_exclusions(self.exclude)
+
+    @classmethod
+    def from_settings(cls):
+        """Создает политику из настроек плагина"""
+        settings = sublime.load_settings('ftp_backup.sublime-settings')
+        return cls(
+            exclude=settings.get('archive_exclude', []),
+            split_size=get_archive_split_size(),
+            verify=settings.get('archive_verify', True),
+            compare_with_zip=settings.get('archive_compare_with_zip', False)
+        )
+
+def resolve_archive_site_name(folder_path, backup_root, folder_mapping=None, logger=None):
+    """
+    Определяет имя сайта для имени архива: папка сразу после корневой папки бэкапов,
+    с заменой на реальное имя сайта из folder_mapping
+    """
+    folder_parts = [part for part in os.path.normpath(folder_path).split(os.sep) if part]
+    backup_root_parts = [part for part in os.path.normpath(backup_root).split(os.sep) if part]
+
+    site_name = "backup"  # значение по умолчанию
+    if not backup_root_parts:
+        return site_name
+
+    # Находим индекс корневого каталога BackUp в пути
+    root_index = -1
+    for i, part in enumerate(folder_parts):
+        if i < len(folder_parts) - 1 and part == backup_root_parts[-1]:
+            root_index = i
+            break
+
+    # Если нашли корневой каталог, то следующий элемент должен быть именем сайта
+    if root_index >= 0 and root_index + 1 < len(folder_parts):
+        site_name = folder_parts[root_index + 1]
+        if logger:
+            logger.debug(f"Извлечено имя сайта из пути: {site_name}")
+
+        # Проверяем, есть ли сопоставление с реальным именем сайта в folder_mapping
+        for real_site_name, folder_key in (folder_mapping or {}).items():
+            if folder_key == site_name:
+                site_name = real_site_name
+                if logger:
+                    logger.debug(f"Найдено соответствие с реальным именем сайта: {site_name}")
+                break
+
+    return site_name
+
+def resolve_archive_dir(folder_path, logger=None):
+    """
+    Определяет папку для сохранения архива: папка задачи (task_xxx), если она есть в пути,
+    иначе родитель для before/after, иначе сама архивируемая папка
+    """
+    folder_path = os.path.normpath(folder_path)
+    folder_parts = [part for part in folder_path.split(os.sep) if part]
+    zip_dir = folder_path
+
+    # Проверяем, может ли текущая папка быть 'before' или 'after' внутри задачи
+    current_folder = os.path.basename(folder_path)
+    if current_folder in ['before', 'after']:
+        # Поднимаемся на уровень выше - к папке задачи
+        zip_dir = os.path.dirname(folder_path)
+        if logger:
+            logger.debug(f"Обнаружена папка {current_folder}, поднимаемся к папке задачи: {zip_dir}")
+
+    # Ищем, содержит ли путь папку задачи
+    for i, part in enumerate(folder_parts):
+        if part.startswith('task_') or re.match(r'task_[\w-]+', part):
+            # Собираем путь до папки задачи включительно
+            path_parts = folder_parts[:i + 1]
+            if ':' in folder_path:  # Windows путь
+                drive = folder_path.split(':')[0] + ':'
+                zip_dir = os.path.join(drive, os.sep, *path_parts)
+            else:  # Unix путь
+                zip_dir = os.path.join(os.sep, *path_parts)
+            if logger:
+                logger.debug(f"Установлена папка задачи для архива: {zip_dir}")
+            break
+
+    return zip_dir
+
+def build_archive_name(site_name, folder_type=None, archive_format='zip'):
+    """Формирует имя архива: backup_<site>[_<before|after>]_<дата><расширение>"""
+    date_str = datetime.now().strftime("%d.%m.%Y.%H.%M")
+    extension = ARCHIVE_FORMATS[archive_format]
+    if folder_type:
+        return f"backup_{site_name}_{folder_type}_{date_str}{extension}"
+    return f"backup_{site_name}_{date_str}{extension}"
+
+def create_archive(folder_path, backup_root, archive_format='zip', policy=None, folder_type=None,
+                   folder_mapping=None, progress=None, logger=None, archive_dir=None, emit=True):
+    """
+    Единая точка создания архивов для FtpBackupManager, команды архивации и HTTP API.
+    folder_path: архивируемая папка
+    archive_format: 'zip', 'tar.gz' или 'tar.xz'
+    policy: ArchivePolicy (по умолчанию - из настроек)
+    folder_type: 'before', 'after' или None - добавляется в имя архива
+    progress: progress(file_count, source_bytes, arcname) после каждого файла
+    archive_dir: папка для архива (по умолчанию - папка задачи)
+    emit: публиковать события веб-интерфейса и учитывать архив в метриках (False - для замеров)
+    Возвращает ArchiveResult, при ошибке выбрасывает исключение
+    """
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f"Неизвестный формат архива: {archive_format}")
+    if not os.path.isdir(folder_path):
+        raise FileNotFoundError(f"Папка для архивации не существует: {folder_path}")
+    if policy is None:
+        policy = ArchivePolicy.from_settings()
+
+    folder_path = os.path.normpath(folder_path)
+    site_name = resolve_archive_site_name(folder_path, backup_root, folder_mapping, logger)
+    if archive_dir is None:
+        archive_dir = resolve_archive_dir(folder_path, logger)
+    os.makedirs(archive_dir, exist_ok=True)
+    archive_path = os.path.join(archive_dir, build_archive_name(site_name, folder_type, archive_format))
+
+    if logger:
+        logger.debug(f"Создание архива в папке задачи: {archive_path}")
+
+    totals = {'files': 0, 'bytes': 0}
+
+    def on_file_added(arcname, size):
+        totals['files'] += 1
+        totals['bytes'] += size
+        if progress:
+            progress(totals['files'], totals['bytes'], arcname)
+        if emit and totals['files'] % 100 == 0:
+            ftp_backup_events.publish('archive_progress', {
+                'archive': archive_path,
+                'file_count': totals['files'],
+                'source_bytes': totals['bytes']
+            })
+
+    started = time.time()
+    if policy.split_size:
+        parts = write_split_archive(archive_path, folder_path, archive_format, policy.exclusions,
+                                    logger, policy.split_size, progress=on_file_added)
+        paths = [part_path for part_path, _ in parts]
+    else:
+        write_archive(archive_path, folder_path, archive_format, policy.exclusions, logger, on_file_added)
+        paths = [archive_path]
+    elapsed = time.time() - started
+
+    archive_bytes = sum(os.path.getsize(path) for path in paths)
+    if logger:
+        logger.debug(f"Архив успешно создан: {', '.join(paths)} ({totals['files']} файлов, {elapsed:.2f} с)")
+    if emit:
+        ftp_backup_metrics.observe('ftp_backup_archive_seconds', elapsed, format=archive_format)
+        ftp_backup_metrics.inc('ftp_backup_archive_files_total', totals['files'], format=archive_format)
+        ftp_backup_metrics.inc('ftp_backup_archive_source_bytes_total', totals['bytes'], format=archive_format)
+        ftp_backup_metrics.inc('ftp_backup_archive_bytes_total', archive_bytes, format=archive_format)
+        ftp_backup_events.publish('archive_done', {
+            'paths': paths,
+            'file_count': totals['files'],
+            'source_bytes': totals['bytes'],
+            'archive_bytes': archive_bytes
+        })
+
+    return ArchiveResult(paths, archive_format, totals['files'], totals['bytes'], archive_bytes, elapsed)
+
+# Словарь для генерации тестовых файлов, похожих на PHP-код сайтов
+_BENCHMARK_WORDS = [
+    '<?php', 'function', 'return', '$this->', 'array(', 'if', 'else', 'foreach', 'as', '=>',
+    'echo', 'class', 'public', 'private', 'static', 'new', 'null', 'true', 'false', '$result',
+    '$value', '$key', '$item', 'isset(', 'empty(', 'count(', 'require_once', '<div>', '</div>', ';'
+]
+
+def generate_benchmark_tree(root, file_count=2000, file_size=4096, seed=0):
+    """
+    Создает в root дерево бэкапов с типичной структурой
+    сайт/месяц/задача/before|after и file_count текстовыми файлами
+    """
+    import random
+    rng = random.Random(seed)
+    month = datetime.now().strftime("%B %Y")
+    task_path = os.path.join(root, 'benchmark.site', month, 'task_benchmark')
+
+    for i in range(file_count):
+        kind = 'before' if i % 2 == 0 else 'after'
+        folder = os.path.join(task_path, kind, 'modules', f"module_{i // 100:03d}")
+        os.makedirs(folder, exist_ok=True)
+
+        words = []
+        length = 0
+        while length < file_size:
+            word = rng.choice(_BENCHMARK_WORDS)
+            words.append(word)
+            length += len(word) + 1
+        with open(os.path.join(folder, f"file_{i:05d}.php"), 'w', encoding='utf-8') as f:
+            f.write(' '.join(words)[:file_size])
+
+    return os.path.join(root, 'benchmark.site', month)
+
+def run_archive_benchmark(file_count=2000, file_size=4096, formats=None, split_size=0):
+    """
+    Измеряет пропускную способность движка архивации на сгенерированном дереве.
+    Возвращает список словарей с результатами по каждому формату
+    """
+    formats = formats or list(ARCHIVE_FORMATS)
+    work_root = tempfile.mkdtemp(prefix='ftp_backup_benchmark_')
+    results = []
+    try:
+        source = generate_benchmark_tree(work_root, file_count, file_size)
+        for archive_format in formats:
+            output_dir = os.path.join(work_root, 'out_' + archive_format.replace('.', '_'))
+            policy = ArchivePolicy(split_size=split_size, verify=False)
+            # Замер не должен попадать в события веб-интерфейса и метрики как настоящий архив
+            result = create_archive(source, work_root, archive_format, policy, archive_dir=output_dir, emit=False)
+            elapsed = max(result.elapsed, 1e-6)
+            results.append({
+                'format': archive_format,
+                'parts': len(result.paths),
+                'files': result.file_count,
+                'source_bytes': result.source_bytes,
+                'archive_bytes': result.archive_bytes,
+                'elapsed': result.elapsed,
+                'mb_per_s': result.source_bytes / elapsed / (1024 * 1024),
+                'files_per_s': result.file_count / elapsed,
+                'ratio': result.archive_bytes / result.source_bytes * 100 if result.source_bytes else 0
+            })
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+    return results
+
+def format_benchmark_report(results, file_count, file_size):
+    """Формирует текстовый отчет о замере"""
+    lines = [
+        f"Замер движка архивации: {file_count} файлов по {file_size} байт",
+        "",
+        f"{'Формат':<8} {'Томов':>5} {'Время, с':>9} {'МБ/с':>8} {'Файлов/с':>9} {'Размер, байт':>13} {'Сжатие':>7}"
+    ]
+    for r in results:
+        lines.append(
+            f"{r['format']:<8} {r['parts']:>5} {r['elapsed']:>9.2f} {r['mb_per_s']:>8.2f} "
+            f"{r['files_per_s']:>9.0f} {r['archive_bytes']:>13} {r['ratio']:>6.1f}%"
+        )
+    return "\n".join(lines) + "\n"
+
+class FtpBackupBenchmarkArchiveCommand(sublime_plugin.WindowCommand):
+    """Замер скорости архивации на сгенерированном дереве файлов"""
+
+    def run(self, file_count=2000, file_size=4096, split_size_mb=0):
+        sublime.status_message("FTP Backup: Замер архивации запущен...")
+        split_size = int(split_size_mb * 1024 * 1024)
+        sublime.set_timeout_async(lambda: self.benchmark(file_count, file_size, split_size), 0)
+
+    def benchmark(self, file_count, file_size, split_size):
+        try:
+            results = run_archive_benchmark(file_count, file_size, split_size=split_size)
+            report = format_benchmark_report(results, file_count, file_size)
+        except Exception as e:
+            report = f"Ошибка замера архивации: {e}\n"
+        sublime.set_timeout(lambda: self.show_report(report), 0)
+
+    def show_report(self, report):
+        panel = self.window.create_output_panel("ftp_backup_benchmark")
+        panel.run_command("append", {"characters": report, "scroll_to_end": True})
+        self.window.run_command("show_panel", {"panel": "output.ftp_backup_benchmark"})
@@ -0,0 +1,566 @@
+import sublime
+import sublime_plugin
+import os
+import json
+import time
+import bisect
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+# Общий сканер папок бэкапов и метрики
+try:
+    from . import ftp_backup_scanner
+    from . import ftp_backup_metrics
+except ImportError:
+    import ftp_backup_scanner
+    import ftp_backup_metrics
+
+# Имя файла каталога бэкапов в корневой папке бэкапов
+CATALOG_FILE_NAME = 'backup_catalog.json'
+CATALOG_VERSION = 1
+
+# Сколько последних сохраненных файлов хранится в индексе недавних бэкапов
+RECENT_INDEX_SIZE = 500
+
+# Размер блока при вычислении хэша копии
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Задержка отложенной записи каталога после бэкапа, мс: серия сохранений записывается один раз
+SAVE_DELAY = 2000
+
+# Загруженные каталоги по корневым папкам: все команды работают с одним экземпляром
+_CATALOGS = {}
+_CATALOGS_LOCK = threading.Lock()
+
+def get_catalog(backup_root):
+    """Возвращает общий экземпляр каталога для корневой папки бэкапов"""
+    key = os.path.normcase(os.path.abspath(backup_root))
+    with _CATALOGS_LOCK:
+        catalog = _CATALOGS.get(key)
+        if catalog is None:
+            catalog = BackupCatalog(backup_root)
+            _CATALOGS[key] = catalog
+    catalog.reload_if_changed()
+    return catalog
+
+def plugin_unloaded():
+    """Записывает отложенные изменения каталогов при выгрузке плагина"""
+    with _CATALOGS_LOCK:
+        catalogs = list(_CATALOGS.values())
+    for catalog in catalogs:
+        catalog.flush()
+
+def hash_file(file_path):
+    """SHA-1 содержимого файла (читается блоками); None, если файл недоступен"""
+    digest = hashlib.sha1()
+    try:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+def week_key(timestamp):
+    """Начало недели (понедельник) для времени бэкапа: ключ недельной статистики"""
+    day = datetime.fromtimestamp(timestamp).date()
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+def compute_stats(files):
+    """Сводная статистика по индексу версий (полный пересчет)"""
+    stats = {'total_backups': 0, 'total_size': 0, 'weeks': {}, 'most_backed_up': '', 'most_backed_up_count': 0}
+    for relative_path, versions in files.items():
+        for version in versions:
+            _add_to_stats(stats, version, 1)
+        if len(versions) > stats['most_backed_up_count']:
+            stats['most_backed_up'] = relative_path
+            stats['most_backed_up_count'] = len(versions)
+    return stats
+
+def _add_to_stats(stats, version, sign):
+    """Добавляет (sign=1) или вычитает (sign=-1) копию файла из сводной статистики"""
+    stats['total_backups'] += sign
+    stats['total_size'] += sign * version.get('size', 0)
+    week = week_key(version['time'])
+    count = stats['weeks'].get(week, 0) + sign
+    if count > 0:
+        stats['weeks'][week] = count
+    else:
+        stats['weeks'].pop(week, None)
+
+def summarize_stats(stats, now=None):
+    """
+    Статистика для веб-интерфейса: итоги, количество файлов и тренд бэкапов (процент изменения с прошлой недели)
+    stats: результат BackupCatalog.get_statistics(); None - индекс версий еще не построен (нулевая статистика)
+    """
+    stats = stats or {'total_backups': 0, 'total_size': 0, 'unique_files': 0, 'weeks': {}, 'most_backed_up': ''}
+    now = time.time() if now is None else now
+    current_week_backups = stats['weeks'].get(week_key(now), 0)
+    previous_week_backups = stats['weeks'].get(week_key(now - 7 * 24 * 3600), 0)
+    weekly_trend = 0
+    if previous_week_backups > 0:
+        weekly_trend = round(((current_week_backups - previous_week_backups) / previous_week_backups) * 100)
+    return {
+        'total_backups': stats['total_backups'],
+        'total_size': stats['total_size'],
+        'unique_files': stats['unique_files'],
+        'weekly_trend': weekly_trend,
+        'most_backed_up': stats['most_backed_up']
+    }
+
+def encode_cursor(timestamp, path):
+    """Курсор страницы: время и путь последней записи (путь различает записи с одинаковым временем)"""
+    return f"{timestamp!r}|{path}"
+
+def decode_cursor(cursor):
+    """Ключ сортировки (время, путь) из курсора страницы"""
+    timestamp, path = cursor.split('|', 1)
+    return float(timestamp), path
+
+def paginate(items, limit, cursor=None):
+    """
+    Страница списка записей {'time', 'path', ...}, упорядоченного по убыванию (время, путь)
+    cursor: курсор последней записи предыдущей страницы
+    Возвращает (записи страницы, курсор следующей страницы или None)
+    """
+    start = 0
+    if cursor:
+        key = decode_cursor(cursor)
+        start = len(items)
+        for position, item in enumerate(items):
+            if (item['time'], item['path']) < key:
+                start = position
+                break
+    page = items[start:start + limit]
+    next_cursor = None
+    if page and start + limit < len(items):
+        next_cursor = encode_cursor(page[-1]['time'], page[-1]['path'])
+    return page, next_cursor
+
+def _recent_entry(relative_path, file_info, timestamp=None):
+    """
+    Запись индекса недавних бэкапов
+    timestamp: время бэкапа в секундах (по умолчанию разбирается из last_backup_time)
+    """
+    last_backup_time = file_info.get('last_backup_time', '')
+    if timestamp is None:
+        try:
+            timestamp = datetime.strptime(last_backup_time, "%Y-%m-%d %H:%M:%S").timestamp()
+        except ValueError:
+            timestamp = 0
+    return {
+        'path': relative_path,
+        'site': file_info.get('site', 'unknown'),
+        'last_backup_time': last_backup_time,
+        'first_backup_time': file_info.get('first_backup_time', ''),
+        'time': timestamp
+    }
+
+class BackupCatalog:
+    """
+    Каталог бэкапов: материализованные индексы задач по сайтам, версий по файлам,
+    недавно сохраненных файлов и сводная статистика по версиям.
+    Обновляется инкрементально при каждом бэкапе и хранится в backup_catalog.json,
+    поэтому списки задач и статистика файлов строятся без обхода папок
+    """
+
+    def __init__(self, backup_root):
+        self.backup_root = backup_root
+        self.path = os.path.join(backup_root, CATALOG_FILE_NAME)
+        self.lock = threading.RLock()
+        self.data = {'version': CATALOG_VERSION, 'generation': 0}
+        self._loaded_mtime = None
+        self._version_rebuild_running = False
+        self._save_pending = False
+        # Версии, учтенные во время полного построения индекса версий (по списку на каждое построение)
+        self._version_journals = []
+        self.load()
+
+    def load(self):
+        """Загрузка каталога с диска"""
+        with self.lock:
+            try:
+                if os.path.exists(self.path):
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    if data.get('version') == CATALOG_VERSION:
+                        self.data = data
+                    self._loaded_mtime = os.path.getmtime(self.path)
+            except Exception as e:
+                print(f"[FTP Backup ERROR] Ошибка загрузки каталога: {e}")
+
+    def reload_if_changed(self):
+        """Перечитывает каталог, если файл изменен другим процессом"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._loaded_mtime:
+            self.load()
+
+    def save(self):
+        """Атомарное сохранение каталога: запись во временный файл и замена"""
+        with self.lock, ftp_backup_metrics.timer('ftp_backup_catalog_write_seconds'):
+            ftp_backup_metrics.inc('ftp_backup_catalog_writes_total')
+            try:
+                os.makedirs(self.backup_root, exist_ok=True)
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+                self._loaded_mtime = os.path.getmtime(self.path)
+            except Exception as e:
+                print(f"[FTP Backup ERROR] Ошибка сохранения каталога: {e}")
+
+    def schedule_save(self):
+        """
+        Отложенная запись каталога: изменения после бэкапа записываются через SAVE_DELAY одним сохранением,
+        поэтому стоимость записи всего каталога не ложится на каждое сохранение файла
+        """
+        with self.lock:
+            if self._save_pending:
+                return
+            self._save_pending = True
+        sublime.set_timeout_async(self.flush, SAVE_DELAY)
+
+    def flush(self):
+        """Записывает каталог, если есть отложенные изменения"""
+        with self.lock:
+            if not self._save_pending:
+                return
+            self._save_pending = False
+            self.save()
+
+    def get_generation(self):
+        """Номер изменения каталога: увеличивается при каждом обновлении индексов"""
+        with self.lock:
+            return self.data.get('generation', 0)
+
+    def _touch(self):
+        """Отмечает изменение каталога (вызывается под блокировкой)"""
+        self.data['generation'] = self.data.get('generation', 0) + 1
+
+    # Индекс задач
+
+    def has_task_index(self):
+        """Построен ли индекс задач"""
+        with self.lock:
+            return 'tasks' in self.data
+
+    def record_task_file(self, site_folder, task_name, task_path, is_new_file, mod_time):
+        """
+        Учитывает файл, сохраненный в папку задачи
+        is_new_file: файла еще не было в папке задачи (перезапись не увеличивает счетчик)
+        Пока индекс не построен, изменения не учитываются: полное построение найдет файл на диске
+        """
+        with self.lock:
+            if 'tasks' not in self.data:
+                return
+            site_tasks = self.data['tasks'].setdefault(site_folder, {})
+            info = site_tasks.setdefault(task_name, {'file_count': 0, 'mod_time': 0, 'paths': []})
+            if is_new_file:
+                info['file_count'] += 1
+            if mod_time > info['mod_time']:
+                info['mod_time'] = mod_time
+            if task_path not in info['paths']:
+                info['paths'].append(task_path)
+            self._touch()
+
+    def get_tasks(self, site_folder=None):
+        """
+        Возвращает задачи в виде словаря
+        имя задачи -> {'name', 'sites', 'file_count', 'mod_time', 'paths'}
+        site_folder: только задачи указанной папки сайта (None - задачи всех сайтов)
+        """
+        tasks_info = {}
+        with self.lock:
+            for site, site_tasks in self.data.get('tasks', {}).items():
+                if site_folder is not None and site != site_folder:
+                    continue
+                for task_name, info in site_tasks.items():
+                    if task_name not in tasks_info:
+                        tasks_info[task_name] = {
+                            'name': task_name,
+                            'sites': set(),
+                            'file_count': 0,
+                            'mod_time': 0,
+                            'paths': []
+                        }
+                    merged = tasks_info[task_name]
+                    merged['sites'].add(site)
+                    merged['file_count'] += info['file_count']
+                    merged['mod_time'] = max(merged['mod_time'], info['mod_time'])
+                    merged['paths'].extend(info['paths'])
+        return tasks_info
+
+    def rebuild_tasks(self):
+        """Полностью перестраивает индекс задач по содержимому папки бэкапов"""
+        tasks = {}
+        for record in ftp_backup_scanner.scan_tasks(self.backup_root):
+            info = tasks.setdefault(record.site, {}).setdefault(
+                record.name, {'file_count': 0, 'mod_time': 0, 'paths': []}
+            )
+            info['file_count'] += record.file_count
+            info['mod_time'] = max(info['mod_time'], record.mod_time)
+            info['paths'].append(record.path)
+
+        with self.lock:
+            self.data['tasks'] = tasks
+            self._touch()
+        self.save()
+        return tasks
+
+    # Индекс версий файлов
+
+    def has_version_index(self):
+        """Построен ли индекс версий"""
+        with self.lock:
+            return 'files' in self.data
+
+    def record_version(self, relative_path, version):
+        """
+        Учитывает сохраненную копию файла
+        version: {'path', 'site', 'task', 'kind', 'time', 'size', 'hash'}; копия по тому же пути заменяет прежнюю запись
+        Пока индекс не построен, изменения не учитываются: полное построение найдет копию на диске
+        (копии, сохраненные во время построения, запоминаются и добавляются к его результату)
+        """
+        with self.lock:
+            for journal in self._version_journals:
+                journal.append((relative_path, version))
+            if 'files' not in self.data:
+                return
+            versions = self.data['files'].setdefault(relative_path, [])
+            stats = self.data.get('stats')
+            for position, existing in enumerate(versions):
+                if existing['path'] == version['path']:
+                    versions[position] = version
+                    if stats is not None:
+                        _add_to_stats(stats, existing, -1)
+                    break
+            else:
+                versions.append(version)
+            if stats is not None:
+                _add_to_stats(stats, version, 1)
+                if len(versions) > stats['most_backed_up_count']:
+                    stats['most_backed_up'] = relative_path
+                    stats['most_backed_up_count'] = len(versions)
+            self._touch()
+
+    def get_versions(self, relative_path):
+        """Версии файла (копии в папках before/after), самые новые первыми"""
+        with self.lock:
+            versions = list(self.data.get('files', {}).get(relative_path, []))
+        versions.sort(key=lambda version: (version['time'], version['path']), reverse=True)
+        return versions
+
+    def iter_versions(self, site=None, task=None, since=None, until=None):
+        """
+        Обходит версии всех файлов: пары (относительный путь, версия), файлы по алфавиту, версии от старых к новым
+        Фильтры: сайт, задача, время копии в границах since..until (секунды, включительно)
+        Блокировка берется на время чтения версий одного файла, поэтому обход не мешает новым бэкапам
+        """
+        with self.lock:
+            relative_paths = sorted(self.data.get('files', {}))
+        for relative_path in relative_paths:
+            with self.lock:
+                versions = [version for version in self.data.get('files', {}).get(relative_path, [])
+                            if (not site or version.get('site') == site)
+                            and (not task or version.get('task') == task)
+                            and (since is None or version['time'] >= since)
+                            and (until is None or version['time'] <= until)]
+            versions.sort(key=lambda version: (version['time'], version['path']))
+            for version in versions:
+                yield relative_path, version
+
+    def find_version(self, backup_path):
+        """Запись индекса версий для копии файла по ее пути (None, если копия не учтена)"""
+        info = ftp_backup_scanner.describe_backup_path(self.backup_root, backup_path)
+        if info is None:
+            return None
+        backup_path = os.path.normcase(os.path.abspath(backup_path))
+        for version in self.get_versions(info['relative_path']):
+            if os.path.normcase(os.path.abspath(version['path'])) == backup_path:
+                return version
+        return None
+
+    def get_versions_page(self, relative_path, limit, cursor=None):
+        """Страница версий файла, самые новые первыми: (версии, курсор следующей страницы)"""
+        return paginate(self.get_versions(relative_path), limit, cursor)
+
+    def get_version_summary(self, relative_path):
+        """Количество версий файла и время последней версии (None, если версий нет)"""
+        with self.lock:
+            versions = self.data.get('files', {}).get(relative_path, [])
+            if not versions:
+                return 0, None
+            return len(versions), max(version['time'] for version in versions)
+
+    def rebuild_versions(self):
+        """
+        Полностью перестраивает индекс версий по копиям в папках before/after
+        (хэш каждой копии вычисляется заново, поэтому построение читает все копии).
+        Папки обходятся без блокировки; версии, учтенные за это время, добавляются к результату при замене индекса
+        """
+        journal = []
+        with self.lock:
+            self._version_journals.append(journal)
+        try:
+            files = {}
+            for record, info in ftp_backup_scanner.iter_backup_copies(self.backup_root):
+                files.setdefault(info['relative_path'], []).append({
+                    'path': record.path,
+                    'site': info['site'],
+                    'task': info['task'],
+                    'kind': info['kind'],
+                    'time': record.mtime,
+                    'size': record.size,
+                    'hash': hash_file(record.path)
+                })
+        except Exception:
+            with self.lock:
+                self._version_journals.remove(journal)
+            raise
+
+        with self.lock:
+            self._version_journals.remove(journal)
+            for relative_path, version in journal:
+                versions = files.setdefault(relative_path, [])
+                for position, existing in enumerate(versions):
+                    if existing['path'] == version['path']:
+                        versions[position] = version
+                        break
+                else:
+                    versions.append(version)
+            self.data['files'] = files
+            self.data['stats'] = compute_stats(files)
+            self._touch()
+        self.save()
+        return files
+
+    def get_statistics(self):
+        """
+        Сводная статистика: количество и размер копий, количество файлов,
+        бэкапы по неделям и файл с наибольшим числом версий.
+        Возвращает None, пока индекс версий не построен
+        """
+        with self.lock:
+            if 'files' not in self.data:
+                return None
+            if 'stats' not in self.data:
+                # Каталог сохранен до появления статистики: считаем один раз по индексу версий
+                self.data['stats'] = compute_stats(self.data['files'])
+            stats = self.data['stats']
+            return {
+                'total_backups': stats['total_backups'],
+                'total_size': stats['total_size'],
+                'unique_files': len(self.data['files']),
+                'weeks': dict(stats['weeks']),
+                'most_backed_up': stats['most_backed_up'],
+                'most_backed_up_count': stats['most_backed_up_count']
+            }
+
+    def schedule_version_rebuild(self):
+        """Запускает построение индекса версий в фоне, если оно еще не идет"""
+        with self.lock:
+            if self._version_rebuild_running:
+                return
+            self._version_rebuild_running = True
+
+        def rebuild():
+            try:
+                self.rebuild_versions()
+            finally:
+                self._version_rebuild_running = False
+
+        sublime.set_timeout_async(rebuild, 0)
+
+    # Индекс недавних бэкапов
+
+    def record_recent(self, relative_path, file_info):
+        """
+        Отмечает сохранение файла в индексе недавних бэкапов
+        file_info: запись файла из backup_config.json (site, first_backup_time, last_backup_time)
+        Пока индекс не построен, изменения не учитываются: построение возьмет данные из backup_config.json
+        """
+        with self.lock:
+            recent = self.data.get('recent')
+            if recent is None:
+                return
+            # Список упорядочен по (время, путь) (новые в конце) и содержит файл не более одного раза
+            for position, entry in enumerate(recent):
+                if entry['path'] == relative_path:
+                    del recent[position]
+                    break
+            entry = _recent_entry(relative_path, file_info, time.time())
+            if recent and (recent[-1]['time'], recent[-1]['path']) > (entry['time'], entry['path']):
+                # Часы перевели назад: вставляем с сохранением порядка
+                keys = [(item['time'], item['path']) for item in recent]
+                recent.insert(bisect.bisect(keys, (entry['time'], entry['path'])), entry)
+            else:
+                recent.append(entry)
+            del recent[:-RECENT_INDEX_SIZE]
+            self._touch()
+
+    def get_recent(self, limit=10, cursor=None):
+        """
+        Последние сохраненные файлы, самые новые первыми
+        cursor: курсор последней записи предыдущей страницы
+        Возвращает (список записей, курсор следующей страницы или None)
+        """
+        # Построение читает backup_config.json, поэтому выполняется без блокировки
+        with self.lock:
+            has_recent = 'recent' in self.data
+        if not has_recent:
+            self.rebuild_recent()
+        with self.lock:
+            recent = self.data['recent']
+            end = len(recent)
+            if cursor:
+                end = bisect.bisect_left([(entry['time'], entry['path']) for entry in recent], decode_cursor(cursor))
+            page = [dict(entry) for entry in reversed(recent[max(0, end - limit):end])]
+        next_cursor = encode_cursor(page[-1]['time'], page[-1]['path']) if page and end > limit else None
+        return page, next_cursor
+
+    def rebuild_recent(self):
+        """Строит индекс недавних бэкапов по backup_config.json"""
+        config_path = os.path.join(self.backup_root, 'backup_config.json')
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                backup_config = json.load(f)
+        except (OSError, ValueError):
+            backup_config = {}
+
+        recent = [_recent_entry(relative_path, file_info)
+                  for relative_path, file_info in backup_config.items()
+                  if 'last_backup_time' in file_info]
+        recent.sort(key=lambda entry: (entry['time'], entry['path']))
+        with self.lock:
+            self.data['recent'] = recent[-RECENT_INDEX_SIZE:]
+            self._touch()
+        return self.data['recent']
+
+class FtpBackupRebuildIndexCommand(sublime_plugin.WindowCommand):
+    """Перестроение каталога бэкапов по содержимому папки (если индекс устарел)"""
+
+    def run(self):
+        settings = sublime.load_settings('ftp_backup.sublime-settings')
+        backup_root = settings.get('backup_root')
+        if not backup_root or not os.path.exists(backup_root):
+            sublime.status_message("FTP Backup: Папка для бэкапов не найдена")
+            return
+
+        sublime.status_message("FTP Backup: Перестроение индекса задач и версий...")
+        sublime.set_timeout_async(lambda: self.rebuild(backup_root), 0)
+
+    def rebuild(self, backup_root):
+        try:
+            catalog = get_catalog(backup_root)
+            tasks = catalog.rebuild_tasks()
+            files = catalog.rebuild_versions()
+            catalog.rebuild_recent()
+            catalog.save()
+            task_count = sum(len(site_tasks) for site_tasks in tasks.values())
+            sublime.status_message(f"FTP Backup: Индекс перестроен: {len(tasks)} сайтов, {task_count} задач, {len(files)} файлов")
+        except Exception as e:
+            sublime.status_message(f"FTP Backup: Ошибка перестроения индекса: {str(e)}")
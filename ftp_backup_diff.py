@@ -0,0 +1,106 @@
+import hashlib
+import difflib
+import threading
+import collections
+import concurrent.futures
+
+# Построчное сравнение версий файлов для веб-интерфейса.
+# Результаты кэшируются по хэшам содержимого: повторное сравнение той же пары before/after
+# не пересчитывается, а переименование или перемещение копии не сбрасывает кэш
+
+# Сколько результатов сравнения хранится в кэше
+DIFF_CACHE_SIZE = 64
+
+# Файлы больше этого размера не сравниваются
+DIFF_MAX_FILE_SIZE = 2 * 1024 * 1024
+
+# Сколько ждать результата сравнения, секунд
+DIFF_TIMEOUT = 5
+
+# Строк контекста вокруг изменений
+DIFF_CONTEXT_LINES = 3
+
+# Кэш результатов: (хэш A, хэш B) -> результат; порядок - от давно использованных к недавним
+_CACHE = collections.OrderedDict()
+# Сравнения, которые еще выполняются: повторный запрос ждет тот же результат
+_PENDING = {}
+# RLock: обработчик завершения может вызваться сразу в том же потоке, если сравнение уже готово
+_LOCK = threading.RLock()
+
+# Пул для сравнений: запрос не ждет дольше DIFF_TIMEOUT, а сравнение завершается в фоне
+_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+def read_version(file_path):
+    """Читает копию файла целиком с проверкой размера; возвращает (байты, хэш)"""
+    with open(file_path, 'rb') as f:
+        data = f.read(DIFF_MAX_FILE_SIZE + 1)
+    if len(data) > DIFF_MAX_FILE_SIZE:
+        raise ValueError(f"Файл слишком большой для сравнения (больше {DIFF_MAX_FILE_SIZE // 1024} КБ): {file_path}")
+    return data, hashlib.sha1(data).hexdigest()
+
+def compute_diff(data_a, data_b):
+    """
+    Построчное сравнение содержимого.
+    Возвращает {'binary', 'identical', 'added', 'removed', 'hunks'}; hunk - группа изменений с контекстом:
+    {'a_start', 'b_start', 'lines': [[тип, строка], ...]}, тип: ' ' - без изменений, '-' - удалена, '+' - добавлена
+    """
+    result = {'binary': False, 'identical': data_a == data_b, 'added': 0, 'removed': 0, 'hunks': []}
+    if b'\0' in data_a[:8192] or b'\0' in data_b[:8192]:
+        result['binary'] = True
+        return result
+    if result['identical']:
+        return result
+
+    lines_a = data_a.decode('utf-8', errors='replace').splitlines()
+    lines_b = data_b.decode('utf-8', errors='replace').splitlines()
+    matcher = difflib.SequenceMatcher(None, lines_a, lines_b, autojunk=False)
+    for group in matcher.get_grouped_opcodes(DIFF_CONTEXT_LINES):
+        hunk = {'a_start': group[0][1] + 1, 'b_start': group[0][3] + 1, 'lines': []}
+        for tag, a_start, a_end, b_start, b_end in group:
+            if tag == 'equal':
+                hunk['lines'].extend([' ', line] for line in lines_a[a_start:a_end])
+                continue
+            if tag in ('replace', 'delete'):
+                hunk['lines'].extend(['-', line] for line in lines_a[a_start:a_end])
+                result['removed'] += a_end - a_start
+            if tag in ('replace', 'insert'):
+                hunk['lines'].extend(['+', line] for line in lines_b[b_start:b_end])
+                result['added'] += b_end - b_start
+        result['hunks'].append(hunk)
+    return result
+
+def diff_versions(path_a, path_b, timeout=DIFF_TIMEOUT):
+    """
+    Сравнивает две версии файла с кэшированием по хэшам содержимого.
+    Если сравнение не уложилось в timeout, выбрасывает TimeoutError; сравнение при этом
+    завершается в фоне и попадает в кэш, так что повторный запрос получит готовый результат
+    """
+    data_a, hash_a = read_version(path_a)
+    data_b, hash_b = read_version(path_b)
+    key = (hash_a, hash_b)
+
+    with _LOCK:
+        if key in _CACHE:
+            _CACHE.move_to_end(key)
+            return _CACHE[key]
+        future = _PENDING.get(key)
+        if future is None:
+            future = _EXECUTOR.submit(compute_diff, data_a, data_b)
+            _PENDING[key] = future
+            future.add_done_callback(lambda done: _store_result(key, done))
+
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        raise TimeoutError(f"Сравнение не завершилось за {timeout} с, повторите запрос позже")
+
+def _store_result(key, future):
+    """Переносит завершенное сравнение в кэш, вытесняя давно использованные результаты"""
+    with _LOCK:
+        _PENDING.pop(key, None)
+        if future.exception() is not None:
+            return
+        _CACHE[key] = future.result()
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > DIFF_CACHE_SIZE:
+            _CACHE.popitem(last=False)
@@ -0,0 +1,79 @@
+import json
+import itertools
+import threading
+import collections
+
+# Канал событий для веб-интерфейса (Server-Sent Events).
+# Движок бэкапов публикует события, каждая открытая вкладка получает их через свою очередь.
+# Очередь ограничена: медленная вкладка теряет самые старые события (и получает "resync"),
+# но публикация никогда не блокирует бэкап
+
+# Сколько событий хранится для одного клиента
+EVENT_QUEUE_SIZE = 256
+
+# Интервал комментария-пинга в потоке событий, секунд (чтобы прокси и браузер не закрыли соединение)
+KEEPALIVE_INTERVAL = 15
+
+Event = collections.namedtuple('Event', ['id', 'type', 'data'])
+
+_SUBSCRIPTIONS = set()
+_LOCK = threading.Lock()
+_EVENT_IDS = itertools.count(1)
+
+class EventSubscription:
+    """Очередь событий одного клиента"""
+
+    def __init__(self, max_size=EVENT_QUEUE_SIZE):
+        self.events = collections.deque(maxlen=max_size)
+        self.condition = threading.Condition()
+        self.dropped = 0
+
+    def put(self, event):
+        """Добавляет событие; при переполнении вытесняется самое старое"""
+        with self.condition:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append(event)
+            self.condition.notify()
+
+    def get(self, timeout):
+        """
+        Ждет событий не дольше timeout секунд
+        Возвращает (список событий, сколько событий потеряно из-за переполнения)
+        """
+        with self.condition:
+            if not self.events:
+                self.condition.wait(timeout)
+            events = list(self.events)
+            self.events.clear()
+            dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+def subscribe():
+    """Регистрирует нового клиента"""
+    subscription = EventSubscription()
+    with _LOCK:
+        _SUBSCRIPTIONS.add(subscription)
+    return subscription
+
+def unsubscribe(subscription):
+    """Отключает клиента"""
+    with _LOCK:
+        _SUBSCRIPTIONS.discard(subscription)
+
+def publish(event_type, data):
+    """Рассылает событие всем подключенным клиентам (без клиентов ничего не делает)"""
+    with _LOCK:
+        subscriptions = list(_SUBSCRIPTIONS)
+    if not subscriptions:
+        return
+    event = Event(next(_EVENT_IDS), event_type, data)
+    for subscription in subscriptions:
+        subscription.put(event)
+
+def format_event(event_type, data, event_id=None):
+    """Событие в формате text/event-stream"""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return ("\n".join(lines) + "\n\n").encode('utf-8')
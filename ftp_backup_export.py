@@ -0,0 +1,175 @@
+import sublime
+import sublime_plugin
+import os
+import io
+import csv
+import json
+import time
+from datetime import datetime, timedelta
+
+# Каталог бэкапов и сканер папок
+try:
+    from . import ftp_backup_catalog
+    from . import ftp_backup_scanner
+except ImportError:
+    import ftp_backup_catalog
+    import ftp_backup_scanner
+
+# Выгрузка истории бэкапов всех файлов (CSV или JSON Lines) из индекса версий каталога.
+# Строки формируются по одной и отдаются блоками, поэтому память не зависит от размера выгрузки
+
+# Форматы выгрузки: расширение файла и Content-Type ответа
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv; charset=utf-8'),
+    'jsonl': ('jsonl', 'application/x-ndjson; charset=utf-8')
+}
+
+# Колонки выгрузки
+EXPORT_FIELDS = ('relative_path', 'site', 'task', 'kind', 'time', 'timestamp', 'size', 'hash', 'path')
+
+# Размер блока выгрузки, байт
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+def parse_date(value, end_of_day=False):
+    """
+    Граница периода выгрузки: YYYY-MM-DD или время в секундах (timestamp)
+    Для даты и end_of_day=True возвращается конец дня, чтобы граница until включала весь день
+    """
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD or timestamp")
+    if end_of_day:
+        day += timedelta(days=1)
+        return day.timestamp() - 0.000001
+    return day.timestamp()
+
+def history_rows(catalog, site=None, task=None, since=None, until=None):
+    """Строки выгрузки (словари с полями EXPORT_FIELDS) по версиям каталога с учетом фильтров"""
+    for relative_path, version in catalog.iter_versions(site, task, since, until):
+        yield {
+            'relative_path': relative_path,
+            'site': version.get('site', ''),
+            'task': version.get('task', ''),
+            'kind': version.get('kind', ''),
+            'time': datetime.fromtimestamp(version['time']).strftime('%Y-%m-%d %H:%M:%S'),
+            'timestamp': version['time'],
+            'size': version.get('size', 0),
+            'hash': version.get('hash') or '',
+            'path': version['path']
+        }
+
+def iter_export_chunks(rows, export_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """Выгрузка в формате csv или jsonl блоками байт примерно по chunk_size (блок не разрывает строку)"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{export_format}', expected one of: {', '.join(EXPORT_FORMATS)}")
+
+    buffer = io.StringIO()
+    if export_format == 'csv':
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, lineterminator='\n')
+        writer.writeheader()
+        write_row = writer.writerow
+    else:
+        write_row = lambda row: buffer.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    for row in rows:
+        write_row(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def export_history(backup_root, output_path, export_format, site=None, task=None, since=None, until=None):
+    """Записывает выгрузку истории в файл; возвращает количество строк"""
+    catalog = ftp_backup_catalog.get_catalog(backup_root)
+    if not catalog.has_version_index():
+        catalog.rebuild_versions()
+
+    count = 0
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    rows = counted(history_rows(catalog, site, task, since, until))
+    tmp_path = output_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in iter_export_chunks(rows, export_format):
+                f.write(chunk)
+        os.replace(tmp_path, output_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+class FtpBackupExportHistoryCommand(sublime_plugin.WindowCommand):
+    """
+    Выгрузка истории бэкапов всех файлов в reports/history_export_<время>.<формат>
+    Аргументы: format (csv/jsonl), site, task, since, until (YYYY-MM-DD); без site предлагается выбрать сайт
+    """
+
+    def run(self, format='csv', site=None, task=None, since=None, until=None):
+        settings = sublime.load_settings('ftp_backup.sublime-settings')
+        backup_root = settings.get('backup_root')
+        if not backup_root or not os.path.exists(backup_root):
+            sublime.status_message("FTP Backup: Папка для бэкапов не найдена")
+            return
+        if format not in EXPORT_FORMATS:
+            sublime.status_message(f"FTP Backup: Неизвестный формат выгрузки: {format}")
+            return
+
+        try:
+            filters = {
+                'task': task,
+                'since': parse_date(since),
+                'until': parse_date(until, end_of_day=True)
+            }
+        except ValueError as e:
+            sublime.status_message(f"FTP Backup: {str(e)}")
+            return
+
+        # Параметры выгрузки передаются аргументами: повторный запуск команды не меняет уже начатую выгрузку
+        if site is not None:
+            self.start_export(backup_root, format, site, filters)
+            return
+
+        sites = ftp_backup_scanner.list_subdirs(backup_root, skip=ftp_backup_scanner.SERVICE_FOLDERS)
+        self.window.show_quick_panel(
+            ["Все сайты"] + sites,
+            lambda index: self.on_site_selected(index, sites, backup_root, format, filters)
+        )
+
+    def on_site_selected(self, index, sites, backup_root, export_format, filters):
+        if index == -1:
+            return
+        self.start_export(backup_root, export_format, sites[index - 1] if index > 0 else '', filters)
+
+    def start_export(self, backup_root, export_format, site, filters):
+        extension = EXPORT_FORMATS[export_format][0]
+        reports_dir = os.path.join(backup_root, 'reports')
+        os.makedirs(reports_dir, exist_ok=True)
+        output_path = os.path.join(reports_dir, f"history_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}")
+
+        sublime.status_message("FTP Backup: Выгрузка истории бэкапов...")
+        sublime.set_timeout_async(lambda: self.export(backup_root, export_format, site or None, filters, output_path), 0)
+
+    def export(self, backup_root, export_format, site, filters, output_path):
+        start_time = time.time()
+        try:
+            count = export_history(backup_root, output_path, export_format, site=site, **filters)
+            message = f"FTP Backup: Выгружено {count} версий за {time.time() - start_time:.1f} с: {output_path}"
+        except Exception as e:
+            message = f"FTP Backup: Ошибка выгрузки истории: {str(e)}"
+            print(f"[FTP Backup ERROR] Ошибка выгрузки истории: {str(e)}")
+        sublime.set_timeout(lambda: sublime.status_message(message), 0)
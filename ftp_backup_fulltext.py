@@ -0,0 +1,299 @@
+import sublime
+import sublime_plugin
+import os
+import json
+import time
+import array
+import threading
+from datetime import datetime
+
+# Общий сканер папок бэкапов
+try:
+    from . import ftp_backup_scanner
+except ImportError:
+    import ftp_backup_scanner
+
+# Файл полнотекстового индекса в корневой папке бэкапов (дописывается построчно)
+CONTENT_INDEX_FILE_NAME = 'content_index.jsonl'
+
+# Сколько строк с совпадением показывать для одного файла
+PREVIEW_LINES = 3
+
+# Индексы по корневым папкам бэкапов
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+def is_content_index_enabled():
+    """Включен ли полнотекстовый индекс в настройках"""
+    settings = sublime.load_settings('ftp_backup.sublime-settings')
+    return settings.get('content_index_enabled', False)
+
+def get_content_index(backup_root):
+    """Возвращает общий полнотекстовый индекс для корневой папки бэкапов"""
+    key = os.path.normcase(os.path.abspath(backup_root))
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        if index is None:
+            index = ContentIndex(backup_root)
+            _INDEXES[key] = index
+    return index
+
+def extract_trigrams(text):
+    """Множество триграмм текста в нижнем регистре"""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def read_text_file(file_path, max_size):
+    """
+    Читает текстовый файл не больше max_size байт.
+    Возвращает None для больших и двоичных файлов (нулевой байт в начале файла)
+    """
+    try:
+        if os.path.getsize(file_path) > max_size:
+            return None
+        with open(file_path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if b'\0' in data[:8192]:
+        return None
+    return data.decode('utf-8', errors='replace')
+
+class ContentIndex:
+    """
+    Триграммный индекс содержимого бэкапов.
+    Каждая сохраненная копия - документ: метаданные и строка его триграмм дописываются
+    в content_index.jsonl. В памяти для каждой триграммы хранится массив номеров документов;
+    поиск пересекает массивы триграмм запроса и читает только файлы-кандидаты.
+    Перезапись копии по тому же пути заменяет документ, старая запись становится неактуальной
+    """
+
+    def __init__(self, backup_root):
+        self.backup_root = backup_root
+        self.path = os.path.join(backup_root, CONTENT_INDEX_FILE_NAME)
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.docs = {}
+        self.doc_by_path = {}
+        self.postings = {}
+        self.next_id = 0
+
+    def _ensure_loaded(self):
+        """Загружает индекс с диска при первом обращении; при большом числе устаревших записей файл сжимается"""
+        if self.loaded:
+            return
+        self.loaded = True
+        if not os.path.exists(self.path):
+            return
+
+        record_count = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    record_count += 1
+                    trigrams = record.pop('trigrams', '')
+                    self._add_document(record, (trigrams[i:i + 3] for i in range(0, len(trigrams), 3)))
+        except Exception as e:
+            print(f"[FTP Backup ERROR] Ошибка загрузки полнотекстового индекса: {e}")
+
+        if record_count > 2 * len(self.docs) + 100:
+            self._compact()
+
+    def _add_document(self, record, trigrams):
+        """Добавляет документ в память, заменяя предыдущий документ с тем же путем"""
+        doc_id = record['id']
+        previous_id = self.doc_by_path.get(record['path'])
+        if previous_id is not None:
+            self.docs.pop(previous_id, None)
+        self.docs[doc_id] = record
+        self.doc_by_path[record['path']] = doc_id
+        self.next_id = max(self.next_id, doc_id + 1)
+        for trigram in trigrams:
+            postings = self.postings.get(trigram)
+            if postings is None:
+                postings = self.postings[trigram] = array.array('I')
+            postings.append(doc_id)
+
+    def _compact(self):
+        """Переписывает файл индекса без устаревших записей"""
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(self.path, 'r', encoding='utf-8') as source, open(tmp_path, 'w', encoding='utf-8') as target:
+                for line in source:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if self.docs.get(record['id'], {}).get('path') == record['path']:
+                        target.write(line)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"[FTP Backup ERROR] Ошибка сжатия полнотекстового индекса: {e}")
+
+    def add_file(self, backup_path, info=None, max_size=512 * 1024):
+        """
+        Индексирует сохраненную копию файла.
+        info: сайт, задача, тип версии и относительный путь (по умолчанию определяются по пути)
+        Возвращает True, если файл проиндексирован
+        """
+        info = info or ftp_backup_scanner.describe_backup_path(self.backup_root, backup_path)
+        if info is None:
+            return False
+        text = read_text_file(backup_path, max_size)
+        if text is None:
+            return False
+
+        trigrams = extract_trigrams(text)
+        with self.lock:
+            self._ensure_loaded()
+            record = dict(info)
+            record['id'] = self.next_id
+            record['path'] = backup_path
+            # Время версии - mtime копии, как в индексе версий каталога (ctime зависит от ОС)
+            record['time'] = os.path.getmtime(backup_path)
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(dict(record, trigrams=''.join(trigrams)), ensure_ascii=False) + "\n")
+            except Exception as e:
+                print(f"[FTP Backup ERROR] Ошибка записи полнотекстового индекса: {e}")
+                return False
+            self._add_document(record, trigrams)
+        return True
+
+    def rebuild(self, max_size=512 * 1024):
+        """Заново индексирует все копии в папках before/after"""
+        with self.lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.loaded = True
+            self.docs = {}
+            self.doc_by_path = {}
+            self.postings = {}
+            self.next_id = 0
+
+        indexed = 0
+        for record, info in ftp_backup_scanner.iter_backup_copies(self.backup_root):
+            if record.size <= max_size and self.add_file(record.path, info, max_size):
+                indexed += 1
+        return indexed
+
+    def search(self, query, limit=100):
+        """
+        Ищет строку (без учета регистра) в содержимом проиндексированных копий.
+        Возвращает список (метаданные документа, [(номер строки, строка), ...]),
+        самые ранние копии первыми - так видно, в какой версии строка появилась
+        """
+        needle = query.lower()
+        trigrams = extract_trigrams(needle)
+        with self.lock:
+            self._ensure_loaded()
+            if trigrams:
+                posting_lists = sorted((self.postings.get(trigram, ()) for trigram in trigrams), key=len)
+                candidates = set(posting_lists[0])
+                for postings in posting_lists[1:]:
+                    if not candidates:
+                        break
+                    candidates.intersection_update(postings)
+            else:
+                # Запрос короче триграммы: проверяются все документы
+                candidates = set(self.docs)
+            docs = sorted((self.docs[doc_id] for doc_id in candidates if doc_id in self.docs), key=lambda doc: doc['time'])
+
+        results = []
+        for doc in docs:
+            text = read_text_file(doc['path'], float('inf'))
+            if text is None or needle not in text.lower():
+                continue
+            previews = []
+            for number, line in enumerate(text.splitlines(), 1):
+                if needle in line.lower():
+                    previews.append((number, line.strip()[:200]))
+                    if len(previews) >= PREVIEW_LINES:
+                        break
+            results.append((doc, previews))
+            if len(results) >= limit:
+                break
+        return results
+
+def schedule_content_indexing(backup_root, backup_path, info):
+    """Индексирует сохраненную копию в фоне, если полнотекстовый индекс включен"""
+    if not is_content_index_enabled():
+        return
+    settings = sublime.load_settings('ftp_backup.sublime-settings')
+    max_size = settings.get('content_index_max_file_kb', 512) * 1024
+    sublime.set_timeout_async(lambda: get_content_index(backup_root).add_file(backup_path, info, max_size), 0)
+
+def format_search_report(query, results, elapsed):
+    """Формирует текст результатов поиска для панели вывода"""
+    lines = [f"Поиск \"{query}\" в бэкапах: {len(results)} файлов, {elapsed * 1000:.0f} мс", ""]
+    for doc, previews in results:
+        version_time = datetime.fromtimestamp(doc['time']).strftime('%d.%m.%Y %H:%M')
+        lines.append(f"{doc['site']} · {doc['task'] or 'без задачи'} · {doc['kind']} · {version_time} · {doc['relative_path']}")
+        lines.append(f"  {doc['path']}:")
+        for number, line in previews:
+            lines.append(f"    {number}: {line}")
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+class FtpBackupSearchContentCommand(sublime_plugin.WindowCommand):
+    """Поиск строки в содержимом бэкапов по полнотекстовому индексу"""
+
+    def run(self):
+        settings = sublime.load_settings('ftp_backup.sublime-settings')
+        self.backup_root = settings.get('backup_root')
+        if not self.backup_root or not os.path.exists(self.backup_root):
+            sublime.status_message("FTP Backup: Папка для бэкапов не найдена")
+            return
+        if not is_content_index_enabled():
+            sublime.status_message("FTP Backup: Полнотекстовый индекс выключен (content_index_enabled)")
+            return
+
+        self.window.show_input_panel("Искать в бэкапах:", "", self.on_query_entered, None, None)
+
+    def on_query_entered(self, query):
+        if not query:
+            return
+        sublime.status_message(f"FTP Backup: Поиск \"{query}\" в бэкапах...")
+        sublime.set_timeout_async(lambda: self.search(query), 0)
+
+    def search(self, query):
+        start_time = time.time()
+        try:
+            results = get_content_index(self.backup_root).search(query)
+            report = format_search_report(query, results, time.time() - start_time)
+        except Exception as e:
+            report = f"Ошибка поиска в бэкапах: {e}\n"
+        sublime.set_timeout(lambda: self.show_report(report), 0)
+
+    def show_report(self, report):
+        """Показывает результаты; двойной щелчок по строке открывает копию файла"""
+        panel = self.window.create_output_panel("ftp_backup_content_search")
+        panel.settings().set("result_file_regex", r"^  (.+):$")
+        panel.settings().set("result_line_regex", r"^    (\d+): ")
+        panel.run_command("append", {"characters": report})
+        self.window.run_command("show_panel", {"panel": "output.ftp_backup_content_search"})
+
+class FtpBackupRebuildContentIndexCommand(sublime_plugin.WindowCommand):
+    """Полное перестроение полнотекстового индекса по всем копиям"""
+
+    def run(self):
+        settings = sublime.load_settings('ftp_backup.sublime-settings')
+        backup_root = settings.get('backup_root')
+        if not backup_root or not os.path.exists(backup_root):
+            sublime.status_message("FTP Backup: Папка для бэкапов не найдена")
+            return
+
+        max_size = settings.get('content_index_max_file_kb', 512) * 1024
+        sublime.status_message("FTP Backup: Перестроение полнотекстового индекса...")
+        sublime.set_timeout_async(lambda: self.rebuild(backup_root, max_size), 0)
+
+    def rebuild(self, backup_root, max_size):
+        try:
+            indexed = get_content_index(backup_root).rebuild(max_size)
+            sublime.status_message(f"FTP Backup: Полнотекстовый индекс перестроен: {indexed} файлов")
+        except Exception as e:
+            sublime.status_message(f"FTP Backup: Ошибка перестроения полнотекстового индекса: {str(e)}")
@@ -7,13 +7,78 @@ import webbrowser
 import socket
 import threading
 import http.server
-import socketserver
 import urllib.parse
 import sys
+import re
+import zlib
 import time
-from datetime import datetime, timedelta
+import hashlib
+from datetime import datetime
 from functools import partial
 
+# Подключение к основному модулю FTP Backup и движку архивации
+try:
+    from . import ftp_backup
+    from . import ftp_backup_archive
+except ImportError:
+    import ftp_backup
+    import ftp_backup_archive
+
+# Каталог бэкапов, сравнение версий, канал событий, метрики и выгрузка истории
+try:
+    from . import ftp_backup_catalog
+    from . import ftp_backup_diff
+    from . import ftp_backup_events
+    from . import ftp_backup_metrics
+    from . import ftp_backup_export
+except ImportError:
+    import ftp_backup_catalog
+    import ftp_backup_diff
+    import ftp_backup_events
+    import ftp_backup_metrics
+    import ftp_backup_export
+
+# Размер блока при потоковой отдаче файлов
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Файлы меньше этого размера отдаются без сжатия
+GZIP_MIN_SIZE = 1024
+
+# Заголовок Range с одним диапазоном: bytes=начало-конец или bytes=-длина_с_конца
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Запросы API, ответ которых зависит только от каталога бэкапов: ETag строится по номеру изменения каталога
+CATALOG_ETAG_COMMANDS = ('get_recent_backups', 'get_backup_statistics')
+
+# Команды, которые можно выполнить через /api/batch (только чтение данных)
+BATCH_COMMANDS = (
+    'get_status', 'get_settings', 'get_recent_backups', 'get_backup_statistics',
+    'get_file_versions', 'get_file_metadata', 'diff'
+)
+
+# Число попыток выполнить пакет /api/batch на неизменном каталоге
+BATCH_ATTEMPTS = 2
+
+# Случайная часть ETag: после перезапуска Sublime Text номера изменений каталога могут повториться
+ETAG_SEED = os.urandom(4).hex()
+
+# Имя команды API для метки метрик (остальные пути объединяются, чтобы число меток было ограничено)
+API_ENDPOINT_RE = re.compile(r'^/api/([a-z_]{1,40})(/|$)')
+
+# Блок статистики бэкапов для страницы интерфейса: значения заполняются по атрибуту data-stat
+STATISTICS_MARKUP = """
+    <div class="backup-statistics">
+        <div class="stat-item"><span class="stat-label">Всего бэкапов</span> <strong data-stat="total_backups">0</strong></div>
+        <div class="stat-item"><span class="stat-label">Общий размер</span> <strong data-stat="total_size">0.0 MB</strong></div>
+        <div class="stat-item"><span class="stat-label">Файлов</span> <strong data-stat="unique_files">0</strong></div>
+        <div class="stat-item"><span class="stat-label">За неделю</span> <strong data-stat="weekly_trend">0%</strong></div>
+        <div class="stat-item"><span class="stat-label">Чаще всего</span> <strong data-stat="most_backed_up">—</strong></div>
+    </div>
+"""
+
+# Наибольший размер страницы для списков с постраничной загрузкой
+MAX_PAGE_SIZE = 500
+
 # Глобальная переменная для хранения пути к временному HTML-файлу
 TEMP_HTML_PATH = None
 # Глобальная переменная для хранения порта сервера
@@ -21,31 +86,314 @@ SERVER_PORT = None
 # Глобальная переменная для хранения экземпляра сервера
 HTTP_SERVER = None
 
+class BackupHTTPServer(http.server.ThreadingHTTPServer):
+    """
+    Многопоточный HTTP-сервер: каждое соединение обслуживается в отдельном потоке,
+    поэтому параллельные запросы страницы не ждут друг друга
+    """
+    daemon_threads = True
+    block_on_close = False
+
 class BackupHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     """Обработчик HTTP-запросов для FTP Backup интерфейса"""
     
+    # HTTP/1.1: соединения остаются открытыми между запросами (keep-alive),
+    # поэтому каждый ответ обязан содержать Content-Length
+    protocol_version = "HTTP/1.1"
+    
+    # Заголовки и тело отправляются отдельными записями: без TCP_NODELAY алгоритм Нейгла
+    # вместе с отложенным ACK задерживает каждый ответ keep-alive примерно на 40 мс
+    disable_nagle_algorithm = True
+    
     def __init__(self, *args, directory=None, **kwargs):
         self.directory = directory
+        self.response_code = None
         super().__init__(*args, **kwargs)
     
+    def handle_one_request(self):
+        """Обрабатывает запрос и учитывает его задержку и код ответа в метриках"""
+        self.response_code = None
+        started = time.perf_counter()
+        super().handle_one_request()
+        if self.response_code is None:
+            return  # Соединение закрыто без запроса
+        
+        endpoint = self.metrics_endpoint()
+        ftp_backup_metrics.inc('ftp_backup_http_requests_total', endpoint=endpoint, code=self.response_code)
+        if endpoint != '/api/events':
+            # Поток событий открыт все время жизни вкладки, его длительность - не задержка
+            ftp_backup_metrics.observe('ftp_backup_http_request_seconds', time.perf_counter() - started, endpoint=endpoint)
+    
+    def metrics_endpoint(self):
+        """Метка запроса для метрик: команда API, корень, /metrics или файлы"""
+        # При ошибке разбора запроса путь может быть не задан
+        path = urllib.parse.urlparse(getattr(self, 'path', '')).path
+        if path in ('/', '/metrics'):
+            return path
+        match = API_ENDPOINT_RE.match(path)
+        if match:
+            return f"/api/{match.group(1)}"
+        return '/api/other' if path.startswith('/api/') else 'static'
+    
+    def send_response(self, code, message=None):
+        """Запоминает код ответа для метрик (HTTPStatus приводится к числу, чтобы метка была вида "200")"""
+        self.response_code = int(code)
+        super().send_response(code, message)
+    
+    def send_body(self, body, content_type, status=200, headers=None):
+        """Отправляет ответ целиком с заголовком Content-Length; headers - дополнительные заголовки"""
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_json(self, response, status=200, etag=None):
+        """
+        Отправляет JSON-ответ API
+        etag: версия ответа; браузер сохраняет ответ и при следующем запросе присылает If-None-Match
+        """
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'} if etag is not None else None
+        self.send_body(json.dumps(response).encode('utf-8'), 'application/json', status, headers)
+    
+    def api_etag(self, command, path, query):
+        """
+        ETag для запросов, ответ которых можно проверить без вычисления:
+        статус - по текущей задаче и серверу, данные каталога - по номеру изменения каталога.
+        None - ответ всегда вычисляется заново
+        """
+        if command == 'get_status':
+            state = f"{ftp_backup.CURRENT_TASK_NUMBER}|{ftp_backup.CURRENT_SERVER}"
+        elif command in CATALOG_ETAG_COMMANDS:
+            settings = sublime.load_settings('ftp_backup.sublime-settings')
+            backup_root = settings.get('backup_root', os.path.join(os.path.expanduser("~"), "Desktop", "BackUp"))
+            state = f"{backup_root}|{ftp_backup_catalog.get_catalog(backup_root).get_generation()}"
+            if command == 'get_backup_statistics':
+                # Тренд считается относительно текущей недели
+                state += '|' + ftp_backup_catalog.week_key(time.time())
+        else:
+            return None
+        digest = hashlib.sha1(f"{state}|{path}|{sorted(query.items())}".encode('utf-8')).hexdigest()[:16]
+        return f'"{ETAG_SEED}-{digest}"'
+    
+    def is_not_modified(self, etag):
+        """Совпадает ли ETag с версией ответа, которая уже есть у клиента (If-None-Match)"""
+        if_none_match = self.headers.get('If-None-Match')
+        if etag is None or not if_none_match:
+            return False
+        return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+    
+    def send_not_modified(self, etag):
+        """Ответ 304: у клиента актуальная версия, тело не передается"""
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+    
+    def send_file_raw(self, file_path):
+        """
+        Отдает содержимое файла как есть, блоками по STREAM_CHUNK_SIZE.
+        Поддерживает один диапазон Range (ответ 206) и сжатие gzip, если клиент его принимает
+        (сжатый ответ передается с Transfer-Encoding: chunked, так как его длина заранее неизвестна).
+        Отдаются только файлы внутри корневой папки бэкапов: сервер доступен не только с локального компьютера
+        """
+        settings = sublime.load_settings('ftp_backup.sublime-settings')
+        backup_root = settings.get('backup_root', os.path.join(os.path.expanduser("~"), "Desktop", "BackUp"))
+        resolved_path = resolve_backup_path(file_path, backup_root)
+        if resolved_path is None:
+            self.send_error(403, "Access denied")
+            return
+        file_path = resolved_path
+        
+        if not os.path.isfile(file_path):
+            self.send_error(404, "File not found")
+            return
+        
+        file_size = os.path.getsize(file_path)
+        start, end = 0, file_size - 1
+        status = 200
+        
+        range_header = self.headers.get('Range')
+        if range_header:
+            match = RANGE_RE.match(range_header.strip())
+            if match and (match.group(1) or match.group(2)):
+                if match.group(1):
+                    start = int(match.group(1))
+                    if match.group(2):
+                        end = min(int(match.group(2)), file_size - 1)
+                else:
+                    start = max(0, file_size - int(match.group(2)))
+                if start > end:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{file_size}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                status = 206
+        length = end - start + 1
+        
+        # Диапазон относится к исходным байтам, поэтому частичные ответы не сжимаются
+        use_gzip = (status == 200 and length >= GZIP_MIN_SIZE
+                    and 'gzip' in self.headers.get('Accept-Encoding', ''))
+        
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+            self.send_response(status)
+            self.send_header('Content-type', self.guess_type(file_path))
+            self.send_header('Accept-Ranges', 'bytes')
+            if status == 206:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{file_size}')
+            if use_gzip:
+                self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Transfer-Encoding', 'chunked')
+            else:
+                self.send_header('Content-Length', str(length))
+            self.end_headers()
+            
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if use_gzip else None
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                if compressor:
+                    self.write_chunk(compressor.compress(chunk))
+                else:
+                    self.wfile.write(chunk)
+            if compressor:
+                self.write_chunk(compressor.flush())
+                self.wfile.write(b'0\r\n\r\n')
+    
+    def send_events(self):
+        """
+        Поток событий (Server-Sent Events) для веб-интерфейса: бэкапы, смена задачи, прогресс архивации.
+        Смена задачи определяется сравнением текущей задачи и сервера при каждом пробуждении,
+        так как они меняются из многих команд плагина
+        """
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        
+        subscription = ftp_backup_events.subscribe()
+        task_state = None
+        last_write = 0
+        try:
+            while HTTP_SERVER is not None:
+                events, dropped = subscription.get(timeout=1)
+                
+                chunks = []
+                state = (ftp_backup.CURRENT_TASK_NUMBER, ftp_backup.CURRENT_SERVER)
+                if state != task_state:
+                    task_state = state
+                    chunks.append(ftp_backup_events.format_event('task', {
+                        'current_task': state[0],
+                        'current_server': state[1]
+                    }))
+                if dropped:
+                    # Клиент не успевал читать события: ему нужно перечитать данные целиком
+                    chunks.append(ftp_backup_events.format_event('resync', {'dropped': dropped}))
+                chunks.extend(ftp_backup_events.format_event(event.type, event.data, event.id) for event in events)
+                if not chunks and time.time() - last_write >= ftp_backup_events.KEEPALIVE_INTERVAL:
+                    chunks.append(b': keep-alive\n\n')
+                
+                if chunks:
+                    self.wfile.write(b''.join(chunks))
+                    self.wfile.flush()
+                    last_write = time.time()
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+            pass  # Вкладка закрыта
+        finally:
+            ftp_backup_events.unsubscribe(subscription)
+    
+    def send_history_export(self, query):
+        """
+        Выгрузка истории бэкапов всех файлов: ?format=csv|jsonl&site=...&task=...&since=YYYY-MM-DD&until=YYYY-MM-DD.
+        Строки читаются из индекса версий и передаются блоками (Transfer-Encoding: chunked, gzip при поддержке клиентом)
+        """
+        value = lambda name: query.get(name, [''])[0]
+        export_format = value('format') or 'csv'
+        try:
+            if export_format not in ftp_backup_export.EXPORT_FORMATS:
+                raise ValueError(f"Unsupported export format '{export_format}'")
+            since = ftp_backup_export.parse_date(value('since'))
+            until = ftp_backup_export.parse_date(value('until'), end_of_day=True)
+        except ValueError as e:
+            self.send_json({"status": "error", "message": str(e)}, status=400)
+            return
+        
+        settings = sublime.load_settings('ftp_backup.sublime-settings')
+        backup_root = settings.get('backup_root', os.path.join(os.path.expanduser("~"), "Desktop", "BackUp"))
+        catalog = ftp_backup_catalog.get_catalog(backup_root)
+        if not catalog.has_version_index():
+            catalog.schedule_version_rebuild()
+            self.send_json({"status": "error", "message": "Version index is being built, retry later"}, status=503)
+            return
+        
+        extension, content_type = ftp_backup_export.EXPORT_FORMATS[export_format]
+        filename = f"history_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Disposition', f'attachment; filename="{filename}"')
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        
+        rows = ftp_backup_export.history_rows(catalog, value('site') or None, value('task') or None, since, until)
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if use_gzip else None
+        for chunk in ftp_backup_export.iter_export_chunks(rows, export_format):
+            self.write_chunk(compressor.compress(chunk) if compressor else chunk)
+        if compressor:
+            self.write_chunk(compressor.flush())
+        self.wfile.write(b'0\r\n\r\n')
+    
+    def write_chunk(self, data):
+        """Записывает блок ответа в формате Transfer-Encoding: chunked"""
+        if data:
+            self.wfile.write(f'{len(data):X}\r\n'.encode('ascii') + data + b'\r\n')
+    
     def do_GET(self):
         """Обработка GET-запросов"""
         parsed_path = urllib.parse.urlparse(self.path)
         
         # Корневой путь - показываем основной интерфейс
         if parsed_path.path == '/':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            
             # Читаем HTML из файла
             with open(TEMP_HTML_PATH, 'rb') as f:
-                self.wfile.write(f.read())
+                self.send_body(f.read(), 'text/html')
+            return
+            
+        # Метрики в формате Prometheus
+        elif parsed_path.path == '/metrics':
+            self.send_body(ftp_backup_metrics.render().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8')
+            return
+            
+        # Поток событий для обновления страницы без опроса
+        elif parsed_path.path == '/api/events':
+            self.send_events()
+            return
+            
+        # Содержимое файла бэкапа потоком (без JSON, с поддержкой Range и gzip)
+        elif parsed_path.path.startswith('/api/get_file_raw/'):
+            self.send_file_raw(urllib.parse.unquote(parsed_path.path[len('/api/get_file_raw/'):]))
+            return
+            
+        # Выгрузка истории всех файлов в CSV или JSON Lines потоком
+        elif parsed_path.path == '/api/export_history':
+            self.send_history_export(urllib.parse.parse_qs(parsed_path.query))
             return
             
         # API для выполнения команд
         elif parsed_path.path.startswith('/api/'):
-            self.handle_api_request(parsed_path.path)
+            self.handle_api_request(parsed_path.path, urllib.parse.parse_qs(parsed_path.query))
             return
             
         # Для всех остальных запросов - файлы из директории
@@ -83,7 +431,9 @@ class BackupHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         response = {"status": "error", "message": "Unknown command"}
         
         try:
-            if command == "save_settings":
+            if command == "batch":
+                response = self.run_batch(data.get("requests", []))
+            elif command == "save_settings":
                 # Сохраняем настройки
                 if "backup_root" in data:
                     # Загружаем настройки
@@ -126,37 +476,97 @@ class BackupHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                         if not os.path.exists(version_path):
                             response = {"status": "error", "message": "Version file not found"}
                         else:
-                            # Сначала делаем резервную копию текущего файла
-                            if os.path.exists(file_path):
-                                # Создаем автоматический бэкап текущего файла перед восстановлением
-                                sublime.active_window().run_command("ftp_backup_create_before", {"file_path": file_path})
+                            # Снимок текущего файла, побайтовое копирование версии и проверка хэша
+                            settings = sublime.load_settings('ftp_backup.sublime-settings')
+                            backup_root = settings.get('backup_root', os.path.join(os.path.expanduser("~"), "Desktop", "BackUp"))
+                            result = ftp_backup.FtpBackupManager(backup_root).restore_version(version_path, file_path)
                             
-                            # Копируем содержимое выбранной версии в текущий файл
-                            with open(version_path, 'r', encoding='utf-8', errors='replace') as source:
-                                content = source.read()
-                            
-                            # Создаем директорию, если её нет
-                            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                            
-                            with open(file_path, 'w', encoding='utf-8') as target:
-                                target.write(content)
-                            
-                            response = {"status": "success", "message": "File version restored"}
+                            response = {
+                                "status": "success",
+                                "message": "File version restored",
+                                "snapshot_path": result['snapshot_path'],
+                                "hash": result['hash'],
+                                "verified": result['verified'],
+                                "size": result['size']
+                            }
                     except Exception as e:
                         response = {"status": "error", "message": str(e)}
                 else:
                     response = {"status": "error", "message": "Missing version_path or file_path"}
+            elif command == "create_archive":
+                # Создаем архив папки через общий движок архивации
+                if "folder_path" in data:
+                    settings = sublime.load_settings('ftp_backup.sublime-settings')
+                    backup_root = settings.get('backup_root', os.path.join(os.path.expanduser("~"), "Desktop", "BackUp"))
+                    folder_path = os.path.normpath(data["folder_path"])
+                    
+                    # Разрешаем архивировать только папки внутри корневой папки бэкапов
+                    if os.path.commonpath([os.path.abspath(folder_path), os.path.abspath(backup_root)]) != os.path.abspath(backup_root):
+                        response = {"status": "error", "message": "Folder is outside of backup root"}
+                    else:
+                        backup_manager = ftp_backup.FtpBackupManager(backup_root)
+                        result = ftp_backup_archive.create_archive(
+                            folder_path,
+                            backup_root,
+                            data.get("format", settings.get('archive_format', 'zip')),
+                            folder_type=data.get("folder_type"),
+                            folder_mapping=backup_manager.folder_mapping,
+                            logger=backup_manager.logger
+                        )
+                        response = {
+                            "status": "success",
+                            "paths": result.paths,
+                            "format": result.archive_format,
+                            "file_count": result.file_count,
+                            "source_bytes": result.source_bytes,
+                            "archive_bytes": result.archive_bytes,
+                            "elapsed": result.elapsed
+                        }
+                else:
+                    response = {"status": "error", "message": "Missing folder_path"}
         except Exception as e:
             response = {"status": "error", "message": str(e)}
         
         # Отправляем ответ
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode('utf-8'))
+        self.send_json(response)
     
-    def handle_api_request(self, path):
-        """Обработка API-запросов"""
+    def run_batch(self, requests):
+        """
+        Выполняет несколько GET-команд за один запрос
+        requests: [{"command": ..., "params": сегмент пути после команды, "query": {имя: значение}}, ...]
+        Общая блокировка каталога не берется: каждая команда читает каталог под своей короткой блокировкой,
+        а чтение файлов и сравнение версий (diff) идут без нее и не задерживают бэкапы.
+        Настройки и каталог определяются один раз на весь пакет. Если каталог изменился во время выполнения,
+        пакет выполняется повторно (до BATCH_ATTEMPTS раз).
+        generation - номер изменения каталога, которому соответствуют все результаты;
+        consistent: false и generation: null - каталог менялся при каждой попытке
+        """
+        settings = sublime.load_settings('ftp_backup.sublime-settings')
+        backup_root = settings.get('backup_root', os.path.join(os.path.expanduser("~"), "Desktop", "BackUp"))
+        catalog = ftp_backup_catalog.get_catalog(backup_root)
+        
+        for attempt in range(BATCH_ATTEMPTS):
+            generation = catalog.get_generation()
+            results = [self.run_batch_request(request, backup_root) for request in requests]
+            if catalog.get_generation() == generation:
+                return {"status": "success", "generation": generation, "consistent": True, "results": results}
+        return {"status": "success", "generation": None, "consistent": False, "results": results}
+    
+    def run_batch_request(self, request, backup_root):
+        """Выполняет одну команду пакета"""
+        command = request.get("command", "")
+        if command not in BATCH_COMMANDS:
+            return {"status": "error", "message": f"Command is not allowed in batch: {command}"}
+        parts = [command] + ([str(request["params"])] if request.get("params") is not None else [])
+        query = {name: [str(value)] for name, value in request.get("query", {}).items()}
+        return self.run_api_command(command, parts, query, backup_root)
+    
+    def handle_api_request(self, path, query=None):
+        """
+        Обработка API-запросов
+        query: параметры строки запроса (результат urllib.parse.parse_qs)
+        """
+        query = query or {}
         # Разбираем путь запроса
         parts = path.split('/')[2:]  # Отбрасываем '/api/'
         
@@ -166,6 +576,31 @@ class BackupHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             
         command = parts[0]
         
+        # Условный запрос: если данные не менялись, ответ не вычисляется и не сериализуется
+        try:
+            etag = self.api_etag(command, path, query)
+        except Exception as e:
+            print(f"[FTP Backup ERROR] Ошибка вычисления ETag: {e}")
+            etag = None
+        if self.is_not_modified(etag):
+            self.send_not_modified(etag)
+            return
+        
+        response = self.run_api_command(command, parts, query)
+        
+        # Отправляем ответ (ETag только для успешных ответов: ошибки не кэшируются)
+        self.send_json(response, etag=etag if response.get("status") == "success" else None)
+    
+    def run_api_command(self, command, parts, query, backup_root=None):
+        """
+        Выполняет GET-команду API и возвращает ответ в виде словаря
+        parts: части пути после '/api/' (первая - имя команды)
+        backup_root: корневая папка бэкапов (по умолчанию берется из настроек)
+        """
+        if backup_root is None:
+            settings = sublime.load_settings('ftp_backup.sublime-settings')
+            backup_root = settings.get('backup_root', os.path.join(os.path.expanduser("~"), "Desktop", "BackUp"))
+        
         # Простой ответ для подтверждения запроса
         response = {"status": "success", "message": f"Command {command} executed"}
         
@@ -214,7 +649,6 @@ class BackupHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 # Возвращаем текущие настройки
                 try:
                     settings = sublime.load_settings('ftp_backup.sublime-settings')
-                    backup_root = settings.get('backup_root', os.path.join(os.path.expanduser("~"), "Desktop", "BackUp"))
                     create_month_folder = settings.get('create_month_folder', True)
                     
                     # Получаем текущий номер задачи
@@ -235,38 +669,14 @@ class BackupHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             elif command == "get_recent_backups":
                 # Возвращаем последние сохраненные файлы
                 try:
-                    # Получаем путь к корневой папке бэкапов
-                    settings = sublime.load_settings('ftp_backup.sublime-settings')
-                    backup_root = settings.get('backup_root', os.path.join(os.path.expanduser("~"), "Desktop", "BackUp"))
-                    
-                    # Загружаем конфигурацию бэкапов
-                    config_path = os.path.join(backup_root, 'backup_config.json')
-                    recent_files = []
+                    # Страница индекса недавних бэкапов: ?limit=...&cursor=...
+                    limit, cursor = parse_page_query(query, 10)
+                    recent_files, next_cursor = ftp_backup_catalog.get_catalog(backup_root).get_recent(limit, cursor)
                     
-                    if os.path.exists(config_path):
-                        with open(config_path, 'r', encoding='utf-8') as f:
-                            backup_config = json.load(f)
-                            
-                        # Преобразуем в список и сортируем по времени последнего бэкапа
-                        files = []
-                        for path, info in backup_config.items():
-                            if 'last_backup_time' in info:
-                                files.append({
-                                    'path': path,
-                                    'site': info.get('site', 'unknown'),
-                                    'last_backup_time': info.get('last_backup_time', ''),
-                                    'first_backup_time': info.get('first_backup_time', '')
-                                })
-                        
-                        # Сортируем по времени последнего бэкапа (сначала новые)
-                        files.sort(key=lambda x: x['last_backup_time'], reverse=True)
-                        
-                        # Берем последние 10 файлов
-                        recent_files = files[:10]
-                        
                     response = {
                         "status": "success",
-                        "recent_files": recent_files
+                        "recent_files": recent_files,
+                        "next_cursor": next_cursor
                     }
                 except Exception as e:
                     response = {"status": "error", "message": str(e)}
@@ -275,73 +685,27 @@ class BackupHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 if len(parts) > 1:
                     file_path = urllib.parse.unquote(parts[1])
                     try:
-                        # Получаем корневую папку бэкапов
-                        settings = sublime.load_settings('ftp_backup.sublime-settings')
-                        backup_root = settings.get('backup_root', os.path.join(os.path.expanduser("~"), "Desktop", "BackUp"))
+                        # Версии берутся из индекса каталога страницами: ?limit=...&cursor=...
+                        catalog = ftp_backup_catalog.get_catalog(backup_root)
+                        if not catalog.has_version_index():
+                            catalog.schedule_version_rebuild()
+                        limit, cursor = parse_page_query(query, 50)
+                        page, next_cursor = catalog.get_versions_page(file_path, limit, cursor)
+                        versions = [format_version(version) for version in page]
                         
-                        # Загружаем конфигурацию бэкапов
-                        config_path = os.path.join(backup_root, 'backup_config.json')
-                        versions = []
-                        
-                        if os.path.exists(config_path):
-                            with open(config_path, 'r', encoding='utf-8') as f:
-                                backup_config = json.load(f)
-                            
-                            # Получаем информацию о конкретном файле
-                            if file_path in backup_config:
-                                file_info = backup_config[file_path]
-                                backup_dir = file_info.get('backup_dir', '')
-                                
-                                if backup_dir and os.path.exists(backup_dir):
-                                    # Ищем все версии файла
-                                    file_name = os.path.basename(file_path)
-                                    for backup_file in os.listdir(backup_dir):
-                                        if file_name in backup_file:
-                                            # Определяем тип бэкапа (before/after)
-                                            backup_type = 'Unknown'
-                                            if '_before_' in backup_file:
-                                                backup_type = 'Before'
-                                            elif '_after_' in backup_file:
-                                                backup_type = 'After'
-                                            elif '_auto_' in backup_file:
-                                                backup_type = 'Auto'
-                                            
-                                            # Получаем время из имени файла или из метаданных
-                                            time_str = ''
-                                            try:
-                                                # Пытаемся извлечь дату из имени файла
-                                                # Формат примерно такой: file_name_20230415_123045.php
-                                                parts = backup_file.split('_')
-                                                if len(parts) >= 2:
-                                                    date_part = parts[-2]
-                                                    time_part = parts[-1].split('.')[0]
-                                                    if len(date_part) == 8 and len(time_part) == 6:
-                                                        time_str = f"{date_part[:4]}-{date_part[4:6]}-{date_part[6:8]} {time_part[:2]}:{time_part[2:4]}:{time_part[4:6]}"
-                                            except:
-                                                # Если не получилось извлечь дату из имени, используем дату модификации
-                                                backup_path = os.path.join(backup_dir, backup_file)
-                                                time_str = datetime.fromtimestamp(os.path.getmtime(backup_path)).strftime('%Y-%m-%d %H:%M:%S')
-                                            
-                                            versions.append({
-                                                'path': os.path.join(backup_dir, backup_file),
-                                                'type': backup_type,
-                                                'time': time_str
-                                            })
-                                    
-                                    # Текущая версия файла (если существует)
-                                    if os.path.exists(file_path):
-                                        versions.append({
-                                            'path': file_path,
-                                            'type': 'Current',
-                                            'time': datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
-                                        })
-                                    
-                                    # Сортируем версии по времени (новые вверху)
-                                    versions.sort(key=lambda x: x['time'], reverse=True)
+                        # Текущая версия файла (если существует) - в начале первой страницы
+                        if not cursor and os.path.exists(file_path):
+                            versions.insert(0, {
+                                'path': file_path,
+                                'type': 'Current',
+                                'time': datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d %H:%M:%S'),
+                                'size': os.path.getsize(file_path)
+                            })
                         
                         response = {
                             "status": "success",
-                            "versions": versions
+                            "versions": versions,
+                            "next_cursor": next_cursor
                         }
                     except Exception as e:
                         response = {"status": "error", "message": str(e)}
@@ -410,10 +774,6 @@ class BackupHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 if len(parts) > 1:
                     file_path = urllib.parse.unquote(parts[1])
                     try:
-                        # Получаем корневую папку бэкапов
-                        settings = sublime.load_settings('ftp_backup.sublime-settings')
-                        backup_root = settings.get('backup_root', os.path.join(os.path.expanduser("~"), "Desktop", "BackUp"))
-                        
                         # Загружаем конфигурацию бэкапов
                         config_path = os.path.join(backup_root, 'backup_config.json')
                         report_data = []
@@ -425,7 +785,9 @@ class BackupHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                             # Получаем информацию о конкретном файле
                             if file_path in backup_config:
                                 file_info = backup_config[file_path]
-                                backup_dir = file_info.get('backup_dir', '')
+                                catalog = ftp_backup_catalog.get_catalog(backup_root)
+                                if not catalog.has_version_index():
+                                    catalog.schedule_version_rebuild()
                                 
                                 # Добавляем основную информацию о файле
                                 report_data.append(f"File History Report for: {file_path}")
@@ -437,65 +799,30 @@ class BackupHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                                 report_data.append("Backup Versions:")
                                 report_data.append("-" * 60)
                                 
-                                if backup_dir and os.path.exists(backup_dir):
-                                    # Ищем все версии файла
-                                    file_name = os.path.basename(file_path)
-                                    backup_files = []
-                                    
-                                    for backup_file in os.listdir(backup_dir):
-                                        if file_name in backup_file:
-                                            backup_type = 'Unknown'
-                                            if '_before_' in backup_file:
-                                                backup_type = 'Before'
-                                            elif '_after_' in backup_file:
-                                                backup_type = 'After'
-                                            elif '_auto_' in backup_file:
-                                                backup_type = 'Auto'
-                                            
-                                            # Получаем время из имени файла или из метаданных
-                                            time_str = ''
-                                            try:
-                                                # Пытаемся извлечь дату из имени файла
-                                                parts = backup_file.split('_')
-                                                if len(parts) >= 2:
-                                                    date_part = parts[-2]
-                                                    time_part = parts[-1].split('.')[0]
-                                                    if len(date_part) == 8 and len(time_part) == 6:
-                                                        time_str = f"{date_part[:4]}-{date_part[4:6]}-{date_part[6:8]} {time_part[:2]}:{time_part[2:4]}:{time_part[4:6]}"
-                                            except:
-                                                # Если не получилось извлечь дату из имени, используем дату модификации
-                                                backup_path = os.path.join(backup_dir, backup_file)
-                                                time_str = datetime.fromtimestamp(os.path.getmtime(backup_path)).strftime('%Y-%m-%d %H:%M:%S')
-                                            
-                                            backup_path = os.path.join(backup_dir, backup_file)
-                                            file_size = os.path.getsize(backup_path)
-                                            
-                                            backup_files.append({
-                                                'path': backup_path,
-                                                'type': backup_type,
-                                                'time': time_str,
-                                                'size': file_size
-                                            })
-                                    
-                                    # Сортируем версии по времени (новые вверху)
-                                    backup_files.sort(key=lambda x: x['time'], reverse=True)
-                                    
-                                    # Добавляем текущую версию, если она существует
-                                    if os.path.exists(file_path):
-                                        backup_files.insert(0, {
-                                            'path': file_path,
-                                            'type': 'Current',
-                                            'time': datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d %H:%M:%S'),
-                                            'size': os.path.getsize(file_path)
-                                        })
-                                    
-                                    # Добавляем информацию о каждой версии
-                                    for idx, version in enumerate(backup_files, 1):
-                                        report_data.append(f"{idx}. {version['type']} Version")
-                                        report_data.append(f"   Time: {version['time']}")
-                                        report_data.append(f"   Size: {version['size']} bytes")
-                                        report_data.append(f"   Path: {version['path']}")
-                                        report_data.append("")
+                                # Версии из индекса каталога; ?limit=...&cursor=... - отчет по странице истории
+                                limit, cursor = parse_page_query(query, None)
+                                versions = catalog.get_versions(file_path)
+                                page, next_cursor = ftp_backup_catalog.paginate(versions, limit or len(versions), cursor)
+                                backup_files = [format_version(version) for version in page]
+                                
+                                # Добавляем текущую версию, если она существует
+                                if not cursor and os.path.exists(file_path):
+                                    backup_files.insert(0, {
+                                        'path': file_path,
+                                        'type': 'Current',
+                                        'time': datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d %H:%M:%S'),
+                                        'size': os.path.getsize(file_path)
+                                    })
+                                
+                                # Добавляем информацию о каждой версии
+                                for idx, version in enumerate(backup_files, 1):
+                                    report_data.append(f"{idx}. {version['type']} Version")
+                                    report_data.append(f"   Time: {version['time']}")
+                                    report_data.append(f"   Size: {version['size']} bytes")
+                                    if version.get('hash'):
+                                        report_data.append(f"   SHA-1: {version['hash']}")
+                                    report_data.append(f"   Path: {version['path']}")
+                                    report_data.append("")
                                 
                                 # Создаем директорию для отчетов, если её нет
                                 reports_dir = os.path.join(backup_root, 'reports')
@@ -511,7 +838,8 @@ class BackupHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                                 response = {
                                     "status": "success",
                                     "message": "History report exported successfully",
-                                    "export_path": report_path
+                                    "export_path": report_path,
+                                    "next_cursor": next_cursor
                                 }
                             else:
                                 response = {"status": "error", "message": "File not found in backup config"}
@@ -521,116 +849,101 @@ class BackupHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                         response = {"status": "error", "message": str(e)}
                 else:
                     response = {"status": "error", "message": "Missing file path"}
-            elif command == "get_backup_statistics":
+            elif command == "diff":
+                # Сравнение двух версий: ?a=...&b=... (пути к копиям) или ?file=... (последние before и after файла)
                 try:
-                    # Получаем корневую папку бэкапов
-                    settings = sublime.load_settings('ftp_backup.sublime-settings')
-                    backup_root = settings.get('backup_root', os.path.join(os.path.expanduser("~"), "Desktop", "BackUp"))
-                    
-                    # Загружаем конфигурацию бэкапов
-                    config_path = os.path.join(backup_root, 'backup_config.json')
-                    
-                    total_backups = 0
-                    total_size = 0
-                    unique_files = 0
-                    most_backed_up_file = ""
-                    most_backed_up_count = 0
-                    file_backup_counts = {}
+                    if 'file' in query:
+                        versions = ftp_backup_catalog.get_catalog(backup_root).get_versions(query['file'][0])
+                        latest = {}
+                        for version in versions:
+                            latest.setdefault(version['kind'], version['path'])
+                        path_a, path_b = latest.get('before'), latest.get('after')
+                        if not path_a or not path_b:
+                            # Нет пары before/after: сравниваем две последние версии
+                            if len(versions) < 2:
+                                raise ValueError("Для сравнения нужно минимум две версии файла")
+                            path_a, path_b = versions[1]['path'], versions[0]['path']
+                    elif 'a' in query and 'b' in query:
+                        path_a, path_b = query['a'][0], query['b'][0]
+                    else:
+                        raise ValueError("Missing file path")
                     
-                    # Статистика для тренда
-                    current_week_backups = 0
-                    previous_week_backups = 0
-                    
-                    if os.path.exists(config_path):
-                        with open(config_path, 'r', encoding='utf-8') as f:
-                            backup_config = json.load(f)
-                        
-                        # Текущая дата
-                        now = datetime.now()
-                        
-                        # Начало текущей недели и предыдущей недели
-                        current_week_start = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
-                        previous_week_start = current_week_start - timedelta(days=7)
-                        
-                        # Подсчитываем статистику
-                        unique_files = len(backup_config)
-                        
-                        for file_path, file_info in backup_config.items():
-                            # Подсчитываем бэкапы для каждого файла
-                            backup_dir = file_info.get('backup_dir', '')
-                            
-                            if backup_dir and os.path.exists(backup_dir):
-                                file_name = os.path.basename(file_path)
-                                backup_count = 0
-                                
-                                for backup_file in os.listdir(backup_dir):
-                                    if file_name in backup_file:
-                                        backup_count += 1
-                                        total_backups += 1
-                                        
-                                        # Получаем размер файла для общей статистики
-                                        backup_path = os.path.join(backup_dir, backup_file)
-                                        total_size += os.path.getsize(backup_path)
-                                        
-                                        # Проверяем, к какой неделе относится бэкап
-                                        try:
-                                            # Извлекаем дату из имени файла или из метаданных
-                                            backup_time = None
-                                            
-                                            # Пытаемся извлечь дату из имени файла
-                                            parts = backup_file.split('_')
-                                            if len(parts) >= 2:
-                                                date_part = parts[-2]
-                                                time_part = parts[-1].split('.')[0]
-                                                if len(date_part) == 8 and len(time_part) == 6:
-                                                    backup_time = datetime.strptime(f"{date_part} {time_part}", "%Y%m%d %H%M%S")
-                                            
-                                            # Если не получилось извлечь дату из имени, используем дату модификации
-                                            if backup_time is None:
-                                                backup_time = datetime.fromtimestamp(os.path.getmtime(backup_path))
-                                            
-                                            # Проверяем, к какой неделе относится бэкап
-                                            if backup_time >= current_week_start:
-                                                current_week_backups += 1
-                                            elif backup_time >= previous_week_start:
-                                                previous_week_backups += 1
-                                        except:
-                                            pass  # Игнорируем ошибки при определении даты бэкапа
-                                
-                                # Сохраняем количество бэкапов для файла
-                                file_backup_counts[file_path] = backup_count
-                                
-                                # Определяем файл с наибольшим количеством бэкапов
-                                if backup_count > most_backed_up_count:
-                                    most_backed_up_count = backup_count
-                                    most_backed_up_file = file_path
-                        
-                        # Рассчитываем тренд (процентное изменение с прошлой недели)
-                        weekly_trend = 0
-                        if previous_week_backups > 0:
-                            weekly_trend = round(((current_week_backups - previous_week_backups) / previous_week_backups) * 100)
+                    # Сравниваются только копии внутри корневой папки бэкапов
+                    resolved_a = resolve_backup_path(path_a, backup_root)
+                    resolved_b = resolve_backup_path(path_b, backup_root)
+                    if resolved_a is None or resolved_b is None:
+                        raise PermissionError("Access denied: path is outside the backup folder")
                     
                     response = {
                         "status": "success",
-                        "total_backups": total_backups,
-                        "total_size": total_size,
-                        "unique_files": unique_files,
-                        "weekly_trend": weekly_trend,
-                        "most_backed_up": most_backed_up_file
+                        "a": path_a,
+                        "b": path_b,
+                        "diff": ftp_backup_diff.diff_versions(resolved_a, resolved_b)
                     }
                 except Exception as e:
                     response = {"status": "error", "message": str(e)}
+            elif command == "get_backup_statistics":
+                try:
+                    # Статистика поддерживается каталогом при каждом бэкапе
+                    catalog = ftp_backup_catalog.get_catalog(backup_root)
+                    stats = catalog.get_statistics()
+                    if stats is None:
+                        # Индекс версий еще не построен: строим в фоне, пока отдаем пустую статистику
+                        catalog.schedule_version_rebuild()
+                    
+                    # Те же поля приходят во вкладку событием stats после каждого бэкапа
+                    response = dict(status="success", **ftp_backup_catalog.summarize_stats(stats))
+                except Exception as e:
+                    response = {"status": "error", "message": str(e)}
             else:
                 response = {"status": "error", "message": f"Unknown command: {command}"}
         
         except Exception as e:
             response = {"status": "error", "message": str(e)}
         
-        # Отправляем ответ
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode('utf-8'))
+        return response
+
+def resolve_backup_path(path, backup_root):
+    """
+    Путь к файлу с разрешенными символическими ссылками и '..', если он внутри корневой папки бэкапов;
+    None, если путь указывает за ее пределы
+    """
+    root = os.path.normcase(os.path.realpath(backup_root))
+    real_path = os.path.realpath(path)
+    try:
+        inside = os.path.commonpath([root, os.path.normcase(real_path)]) == root
+    except ValueError:
+        # Пути на разных дисках (Windows)
+        return None
+    return real_path if inside else None
+
+def parse_page_query(query, default_limit):
+    """
+    Параметры страницы из строки запроса: ?limit=...&cursor=...
+    default_limit: размер страницы по умолчанию (None - без ограничения)
+    Возвращает (limit, cursor)
+    """
+    limit = default_limit
+    if 'limit' in query:
+        limit = max(1, min(int(query['limit'][0]), MAX_PAGE_SIZE))
+    return limit, query.get('cursor', [None])[0] or None
+
+def format_version(version):
+    """
+    Версия файла из каталога в формате ответа API: метаданные записаны при бэкапе,
+    поэтому ни имя файла, ни сама копия не читаются
+    """
+    return {
+        'path': version['path'],
+        'type': version['kind'].capitalize(),
+        'kind': version['kind'],
+        'site': version.get('site', ''),
+        'task': version.get('task', ''),
+        'time': datetime.fromtimestamp(version['time']).strftime('%Y-%m-%d %H:%M:%S'),
+        'timestamp': version['time'],
+        'size': version.get('size', 0),
+        'hash': version.get('hash')
+    }
 
 def find_free_port():
     """Находит свободный порт для запуска сервера"""
@@ -654,8 +967,8 @@ def start_http_server(html_path):
     # Создаем обработчик с указанием директории
     handler = partial(BackupHTTPRequestHandler, directory=directory)
     
-    # Запускаем сервер в отдельном потоке
-    HTTP_SERVER = socketserver.TCPServer(("", SERVER_PORT), handler)
+    # Запускаем сервер в отдельном потоке (запросы обрабатываются в своих потоках)
+    HTTP_SERVER = BackupHTTPServer(("", SERVER_PORT), handler)
     
     server_thread = threading.Thread(target=HTTP_SERVER.serve_forever)
     server_thread.daemon = True
@@ -668,6 +981,7 @@ def stop_http_server():
     global HTTP_SERVER
     if HTTP_SERVER:
         HTTP_SERVER.shutdown()
+        HTTP_SERVER.server_close()
         HTTP_SERVER = None
 
 def prepare_html_with_api(html_content):
@@ -698,6 +1012,12 @@ def prepare_html_with_api(html_content):
                 return await response.json();
             },
             
+            // Несколько команд за один запрос: [{command, params, query}, ...] -> массив ответов
+            batch: async function(requests) {
+                const result = await this.post('batch', {requests: requests});
+                return result.results || [];
+            },
+            
             getStatus: async function() {
                 return await this.call('get_status');
             },
@@ -706,8 +1026,11 @@ def prepare_html_with_api(html_content):
                 return await this.call('get_settings');
             },
             
-            getRecentBackups: async function() {
-                return await this.call('get_recent_backups');
+            // Страница последних бэкапов; cursor - next_cursor предыдущей страницы
+            getRecentBackups: async function(cursor = null) {
+                const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+                const response = await fetch(`/api/get_recent_backups${query}`);
+                return await response.json();
             },
             
             saveSettings: async function(settings) {
@@ -730,6 +1053,14 @@ def prepare_html_with_api(html_content):
                 return await this.call('create_zip');
             },
             
+            createArchive: async function(folderPath, format = 'zip', folderType = null) {
+                return await this.post('create_archive', {
+                    folder_path: folderPath,
+                    format: format,
+                    folder_type: folderType
+                });
+            },
+            
             openFolder: async function() {
                 return await this.call('open_folder');
             },
@@ -740,6 +1071,31 @@ def prepare_html_with_api(html_content):
             
             changeTask: async function(taskNumber) {
                 return await this.call('change_task', taskNumber);
+            },
+            
+            // Сравнение последних версий before/after файла
+            diffFile: async function(filePath) {
+                const response = await fetch(`/api/diff?file=${encodeURIComponent(filePath)}`);
+                return await response.json();
+            },
+            
+            // Содержимое файла бэкапа; maxBytes - загрузить только начало файла (для предпросмотра)
+            getFileContent: async function(filePath, maxBytes = null) {
+                const headers = maxBytes ? {'Range': `bytes=0-${maxBytes - 1}`} : {};
+                const response = await fetch(`/api/get_file_raw/${encodeURIComponent(filePath)}`, {headers: headers});
+                if (!response.ok) {
+                    return {status: 'error', message: response.statusText};
+                }
+                return {status: 'success', content: await response.text(), partial: response.status === 206};
+            },
+            
+            // Скачивание истории бэкапов всех файлов; filters: {site, task, since, until} (даты YYYY-MM-DD)
+            exportHistory: function(format = 'csv', filters = {}) {
+                const params = new URLSearchParams({format: format});
+                Object.entries(filters).forEach(([name, value]) => {
+                    if (value) params.append(name, value);
+                });
+                window.location.href = `/api/export_history?${params.toString()}`;
             }
         };
 
@@ -783,39 +1139,121 @@ def prepare_html_with_api(html_content):
     # Заменяем обработчики событий для кнопок
     button_handlers = """
     <script>
+        // События от плагина: страница обновляется без периодических запросов
+        function subscribeToEvents() {
+            if (!window.EventSource) return;
+            const events = new EventSource('/api/events');
+            
+            events.addEventListener('task', event => {
+                const data = JSON.parse(event.data);
+                document.querySelector('.task-badge').textContent = data.current_task || '';
+                document.querySelector('.server-badge').textContent = data.current_server || '';
+            });
+            // Новая копия добавляется в начало списка: загруженные кнопкой "Load more" страницы сохраняются
+            events.addEventListener('backup', event => {
+                const data = JSON.parse(event.data);
+                prependRecentBackup({
+                    path: data.relative_path,
+                    site: data.site,
+                    last_backup_time: data.last_backup_time
+                });
+            });
+            // Событие stats содержит ту же статистику, что и ответ get_backup_statistics
+            events.addEventListener('stats', event => {
+                updateStatistics(Object.assign({status: 'success'}, JSON.parse(event.data)));
+            });
+            // Часть событий потеряна: список и статистика перечитываются целиком
+            events.addEventListener('resync', () => {
+                updateRecentBackups();
+                updateStatistics();
+            });
+            events.addEventListener('archive_progress', event => {
+                const data = JSON.parse(event.data);
+                console.log(`Archiving: ${data.file_count} files, ${Math.round(data.source_bytes / 1024)} KB`);
+            });
+            events.addEventListener('archive_done', event => {
+                const data = JSON.parse(event.data);
+                console.log(`Archive created: ${data.paths.join(', ')}`);
+            });
+        }
+        
+        // Показываем сравнение версий файла в отдельном окне поверх страницы
+        async function compareBackups(filePath) {
+            const result = await ftpBackupAPI.diffFile(filePath);
+            if (result.status !== 'success') {
+                alert('Compare failed: ' + result.message);
+                return;
+            }
+            
+            const diff = result.diff;
+            const escape = text => text.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+            let body;
+            if (diff.binary) {
+                body = diff.identical ? 'Binary files are identical' : 'Binary files differ';
+            } else if (diff.identical) {
+                body = 'Versions are identical';
+            } else {
+                body = diff.hunks.map(hunk =>
+                    `<div style="color:#888">@@ -${hunk.a_start} +${hunk.b_start} @@</div>` +
+                    hunk.lines.map(([type, line]) => {
+                        const color = type === '+' ? '#e6ffec' : type === '-' ? '#ffebe9' : 'transparent';
+                        return `<div style="background:${color}">${type} ${escape(line)}</div>`;
+                    }).join('')
+                ).join('');
+            }
+            
+            const overlay = document.createElement('div');
+            overlay.style.cssText = 'position:fixed;inset:0;background:rgba(0,0,0,.5);display:flex;align-items:center;justify-content:center;z-index:1000';
+            overlay.innerHTML = `
+                <div style="background:#fff;color:#000;width:90%;max-height:90%;overflow:auto;padding:16px;border-radius:6px">
+                    <div style="margin-bottom:8px"><b>${escape(filePath)}</b> &nbsp; +${diff.added} / -${diff.removed}</div>
+                    <pre style="margin:0;font-size:12px">${body}</pre>
+                </div>
+            `;
+            overlay.addEventListener('click', event => {
+                if (event.target === overlay) overlay.remove();
+            });
+            document.body.appendChild(overlay);
+        }
+        
+        // Статистика бэкапов; элементы страницы с атрибутом data-stat="<поле>" показывают ее значения
+        // (если в странице таких элементов нет, блок статистики STATISTICS_MARKUP добавляется при подготовке HTML)
+        let dashboardStats = {};
+        
+        async function updateStatistics(result = null) {
+            try {
+                result = result || await ftpBackupAPI.call('get_backup_statistics');
+                if (result.status === 'success') {
+                    dashboardStats = result;
+                    renderStatistics();
+                }
+            } catch (error) {
+                console.error('Error loading statistics:', error);
+            }
+        }
+        
+        function renderStatistics() {
+            document.querySelectorAll('[data-stat]').forEach(element => {
+                const value = dashboardStats[element.dataset.stat];
+                if (value === undefined) return;
+                if (element.dataset.stat === 'total_size') {
+                    element.textContent = `${(value / (1024 * 1024)).toFixed(1)} MB`;
+                } else if (element.dataset.stat === 'weekly_trend') {
+                    element.textContent = `${value > 0 ? '+' : ''}${value}%`;
+                } else {
+                    element.textContent = value === '' ? '—' : value;
+                }
+            });
+        }
+        
         // Обновляем список последних бэкапов
-        async function updateRecentBackups() {
+        async function updateRecentBackups(result = null) {
             try {
-                const result = await ftpBackupAPI.getRecentBackups();
+                result = result || await ftpBackupAPI.getRecentBackups();
                 if (result.status === 'success' && result.recent_files && result.recent_files.length > 0) {
                     const backupList = document.querySelector('.backup-list');
                     backupList.innerHTML = ''; // Очищаем список
-                    
-                    result.recent_files.forEach(file => {
-                        const formattedTime = formatDateTime(file.last_backup_time);
-                        
-                        const backupItem = document.createElement('div');
-                        backupItem.className = 'backup-item';
-                        backupItem.innerHTML = `
-                            <div class="backup-info">
-                                <div class="backup-path">${file.path}</div>
-                                <div class="backup-meta">
-                                    <span><i class="fas fa-server"></i> ${file.site}</span>
-                                    <span><i class="fas fa-clock"></i> ${formattedTime}</span>
-                                </div>
-                            </div>
-                            <div class="backup-actions">
-                                <button class="icon-btn" title="Compare" onclick="alert('Comparing backups is not implemented yet')">
-                                    <i class="fas fa-exchange-alt"></i>
-                                </button>
-                                <button class="icon-btn" title="Open" onclick="alert('Opening file is not implemented yet')">
-                                    <i class="fas fa-external-link-alt"></i>
-                                </button>
-                            </div>
-                        `;
-                        
-                        backupList.appendChild(backupItem);
-                    });
+                    appendRecentBackups(backupList, result);
                 } else {
                     console.error('No recent backups found or error:', result);
                     document.querySelector('.backup-list').innerHTML = '<div class="backup-item"><div class="backup-info">No recent backups found</div></div>';
@@ -826,11 +1264,78 @@ def prepare_html_with_api(html_content):
             }
         }
         
+        // Добавляем страницу бэкапов в список; следующая страница загружается по кнопке
+        function appendRecentBackups(backupList, result) {
+            result.recent_files.forEach(file => backupList.appendChild(createBackupItem(file)));
+            
+            if (result.next_cursor) {
+                const moreButton = document.createElement('button');
+                moreButton.className = 'btn';
+                moreButton.textContent = 'Load more';
+                moreButton.addEventListener('click', async () => {
+                    moreButton.remove();
+                    const nextPage = await ftpBackupAPI.getRecentBackups(result.next_cursor);
+                    if (nextPage.status === 'success') {
+                        appendRecentBackups(backupList, nextPage);
+                    }
+                });
+                backupList.appendChild(moreButton);
+            }
+        }
+        
+        // Добавляем сохраненный файл в начало списка (файл показывается в списке один раз)
+        function prependRecentBackup(file) {
+            const backupList = document.querySelector('.backup-list');
+            backupList.querySelectorAll('.backup-item').forEach(item => {
+                if (!item.dataset.path || item.dataset.path === file.path) item.remove();
+            });
+            backupList.insertBefore(createBackupItem(file), backupList.firstChild);
+        }
+        
+        // Элемент списка последних бэкапов
+        function createBackupItem(file) {
+            const formattedTime = formatDateTime(file.last_backup_time);
+            
+            const backupItem = document.createElement('div');
+            backupItem.className = 'backup-item';
+            backupItem.dataset.path = file.path;
+            backupItem.innerHTML = `
+                <div class="backup-info">
+                    <div class="backup-path">${file.path}</div>
+                    <div class="backup-meta">
+                        <span><i class="fas fa-server"></i> ${file.site}</span>
+                        <span><i class="fas fa-clock"></i> ${formattedTime}</span>
+                    </div>
+                </div>
+                <div class="backup-actions">
+                    <button class="icon-btn" title="Compare" onclick="compareBackups(this.dataset.path)" data-path="${file.path}">
+                        <i class="fas fa-exchange-alt"></i>
+                    </button>
+                    <button class="icon-btn" title="Open" onclick="alert('Opening file is not implemented yet')">
+                        <i class="fas fa-external-link-alt"></i>
+                    </button>
+                </div>
+            `;
+            return backupItem;
+        }
+        
         // После загрузки страницы
         document.addEventListener('DOMContentLoaded', async function() {
-            // Загружаем текущий статус
+            // Статус, настройки, последние бэкапы и статистика загружаются одним запросом
+            let statusData = {}, settingsData = {}, recentData = null, statsData = null;
+            try {
+                [statusData, settingsData, recentData, statsData] = await ftpBackupAPI.batch([
+                    {command: 'get_status'},
+                    {command: 'get_settings'},
+                    {command: 'get_recent_backups'},
+                    {command: 'get_backup_statistics'}
+                ]);
+            } catch (error) {
+                console.error('Error loading dashboard:', error);
+            }
+            
+            // Текущий статус
             try {
-                const statusData = await ftpBackupAPI.getStatus();
                 if (statusData.status === 'success') {
                     if (statusData.current_task) {
                         document.querySelector('.task-badge').textContent = statusData.current_task;
@@ -843,9 +1348,8 @@ def prepare_html_with_api(html_content):
                 console.error('Error loading status:', error);
             }
             
-            // Загружаем настройки
+            // Настройки
             try {
-                const settingsData = await ftpBackupAPI.getSettings();
                 if (settingsData.status === 'success') {
                     document.getElementById('backup-root').value = settingsData.backup_root;
                     document.getElementById('create-month-folder').checked = settingsData.create_month_folder;
@@ -855,8 +1359,10 @@ def prepare_html_with_api(html_content):
                 console.error('Error loading settings:', error);
             }
             
-            // Загружаем последние бэкапы
-            updateRecentBackups();
+            // Последние бэкапы, статистика и подписка на обновления
+            updateRecentBackups(recentData);
+            updateStatistics(statsData);
+            subscribeToEvents();
             
             // Обработчики для кнопок
             document.getElementById('save-backup').addEventListener('click', async function() {
@@ -1003,6 +1509,10 @@ def prepare_html_with_api(html_content):
     </script>
     """
     
+    # Блок статистики, если в шаблоне нет своих элементов data-stat
+    if 'data-stat=' not in html_content:
+        button_handlers = STATISTICS_MARKUP + button_handlers
+    
     # Находим закрывающий тег </body> и вставляем наши обработчики перед ним
     if '</body>' in html_content:
         html_content = html_content.replace('</body>', button_handlers + '</body>')
@@ -0,0 +1,95 @@
+import time
+import threading
+import contextlib
+import collections
+
+# Счетчики и гистограммы задержек плагина в текстовом формате Prometheus (/metrics на сервере интерфейса).
+# Метрики хранятся в памяти процесса Sublime Text и сбрасываются при перезапуске
+
+# Границы корзин гистограмм задержек, секунд
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+Metric = collections.namedtuple('Metric', ['name', 'kind', 'help', 'buckets', 'values'])
+
+_METRICS = collections.OrderedDict()
+_LOCK = threading.Lock()
+
+def _register(name, kind, help_text, buckets=None):
+    """Регистрирует метрику; values: метки -> значение (для гистограммы - [счетчики корзин, сумма, количество])"""
+    _METRICS[name] = Metric(name, kind, help_text, buckets, {})
+
+def inc(name, value=1, **labels):
+    """Увеличивает счетчик"""
+    key = tuple(sorted(labels.items()))
+    with _LOCK:
+        values = _METRICS[name].values
+        values[key] = values.get(key, 0) + value
+
+def observe(name, value, **labels):
+    """Добавляет наблюдение в гистограмму"""
+    metric = _METRICS[name]
+    key = tuple(sorted(labels.items()))
+    with _LOCK:
+        state = metric.values.get(key)
+        if state is None:
+            state = metric.values[key] = [[0] * len(metric.buckets), 0.0, 0]
+        for position, bound in enumerate(metric.buckets):
+            if value <= bound:
+                state[0][position] += 1
+        state[1] += value
+        state[2] += 1
+
+@contextlib.contextmanager
+def timer(name, **labels):
+    """Измеряет длительность блока и добавляет ее в гистограмму"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+def _format_labels(labels, extra=()):
+    """Метки в формате {name="value",...}"""
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def render():
+    """Все метрики в текстовом формате Prometheus"""
+    lines = []
+    with _LOCK:
+        for metric in _METRICS.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in sorted(metric.values.items()):
+                if metric.kind == 'counter':
+                    lines.append(f"{metric.name}{_format_labels(labels)} {value}")
+                    continue
+                bucket_counts, total, count = value
+                for bound, bucket_count in zip(metric.buckets, bucket_counts):
+                    lines.append(f"{metric.name}_bucket{_format_labels(labels, [('le', bound)])} {bucket_count}")
+                lines.append(f"{metric.name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{metric.name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{metric.name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+# Бэкапы файлов
+_register('ftp_backup_backup_phase_seconds', 'histogram', 'Duration of backup_file phases', DEFAULT_BUCKETS)
+_register('ftp_backup_backups_total', 'counter', 'Backup copies written')
+_register('ftp_backup_bytes_copied_total', 'counter', 'Bytes copied into backup copies')
+
+# Каталог бэкапов
+_register('ftp_backup_catalog_write_seconds', 'histogram', 'Duration of catalog saves', DEFAULT_BUCKETS)
+_register('ftp_backup_catalog_writes_total', 'counter', 'Catalog saves')
+
+# Архивы
+_register('ftp_backup_archive_seconds', 'histogram', 'Duration of archive creation', DEFAULT_BUCKETS)
+_register('ftp_backup_archive_files_total', 'counter', 'Files added to archives')
+_register('ftp_backup_archive_source_bytes_total', 'counter', 'Source bytes added to archives')
+_register('ftp_backup_archive_bytes_total', 'counter', 'Bytes written to archive files')
+
+# HTTP-сервер интерфейса
+_register('ftp_backup_http_request_seconds', 'histogram', 'Web interface request latency by endpoint', DEFAULT_BUCKETS)
+_register('ftp_backup_http_requests_total', 'counter', 'Web interface requests by endpoint and status code')
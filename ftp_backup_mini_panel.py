@@ -11,6 +11,22 @@ try:
 except ImportError:
     import ftp_backup
 
+# Каталог бэкапов (индексы задач и версий)
+try:
+    from . import ftp_backup_catalog
+except ImportError:
+    import ftp_backup_catalog
+
+# Корневые папки проектов (как в FtpBackupManager.project_roots)
+PROJECT_ROOTS = [
+    'var\\www\\',
+    'www\\',
+    'public_html\\',
+    'local\\',
+    'htdocs\\',
+    'home\\'
+]
+
 class FtpBackupMiniPanelCommand(sublime_plugin.TextCommand):
     """Команда для отображения мини-панели FTP Backup"""
     
@@ -168,11 +184,10 @@ class FtpBackupMiniPanelCommand(sublime_plugin.TextCommand):
         return html
     
     def get_backup_stats(self, file_path):
-        """Получает статистику бэкапов для файла"""
+        """Получает статистику бэкапов для файла из индекса версий каталога"""
         try:
             settings = sublime.load_settings('ftp_backup.sublime-settings')
             backup_root = settings.get('backup_root')
-            config_path = os.path.join(backup_root, 'backup_config.json')
             
             # Значения по умолчанию
             stats = {
@@ -180,52 +195,31 @@ class FtpBackupMiniPanelCommand(sublime_plugin.TextCommand):
                 'last_backup': 'нет'
             }
             
-            if os.path.exists(config_path):
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    import json
-                    backup_config = json.load(f)
-                
-                # Пытаемся получить относительный путь к файлу, как это делает FTP Backup
-                relative_path = self.extract_relative_path(file_path)
+            catalog = ftp_backup_catalog.get_catalog(backup_root)
+            if not catalog.has_version_index():
+                # Индекс строится один раз в фоне, панель не ждет обхода папок
+                stats['last_backup'] = 'индекс строится...'
+                catalog.schedule_version_rebuild()
+                return stats
+            
+            # Пытаемся получить относительный путь к файлу, как это делает FTP Backup
+            relative_path = self.extract_relative_path(file_path)
+            total, last_time = catalog.get_version_summary(relative_path)
+            stats['total'] = total
+            
+            if last_time:
+                # Форматируем для более дружественного отображения
+                dt = datetime.fromtimestamp(last_time)
+                now = datetime.now()
                 
-                if relative_path in backup_config:
-                    file_info = backup_config[relative_path]
-                    
-                    # Получаем время последнего бэкапа
-                    if 'last_backup_time' in file_info:
-                        last_time = file_info['last_backup_time']
-                        # Форматируем для более дружественного отображения
-                        try:
-                            dt = datetime.strptime(last_time, "%Y-%m-%d %H:%M:%S")
-                            now = datetime.now()
-                            
-                            # Если сегодня
-                            if dt.date() == now.date():
-                                stats['last_backup'] = f"сегодня в {dt.strftime('%H:%M')}"
-                            # Если вчера
-                            elif (now.date() - dt.date()).days == 1:
-                                stats['last_backup'] = f"вчера в {dt.strftime('%H:%M')}"
-                            else:
-                                stats['last_backup'] = dt.strftime('%d.%m.%Y %H:%M')
-                        except:
-                            stats['last_backup'] = last_time
-                    
-                    # Получаем количество бэкапов
-                    # Здесь можно было бы посчитать фактические файлы бэкапов,
-                    # но для простоты просто устанавливаем 1
-                    stats['total'] = 1
-                    
-                    # Ищем папки с бэкапами
-                    backup_dir = os.path.dirname(file_info.get('backup_dir', ''))
-                    if backup_dir and os.path.exists(backup_dir):
-                        file_name = os.path.basename(file_path)
-                        count = 0
-                        for root, dirs, files in os.walk(backup_dir):
-                            for f in files:
-                                if file_name in f:
-                                    count += 1
-                        if count > 0:
-                            stats['total'] = count
+                # Если сегодня
+                if dt.date() == now.date():
+                    stats['last_backup'] = f"сегодня в {dt.strftime('%H:%M')}"
+                # Если вчера
+                elif (now.date() - dt.date()).days == 1:
+                    stats['last_backup'] = f"вчера в {dt.strftime('%H:%M')}"
+                else:
+                    stats['last_backup'] = dt.strftime('%d.%m.%Y %H:%M')
             
             return stats
             
@@ -237,16 +231,8 @@ class FtpBackupMiniPanelCommand(sublime_plugin.TextCommand):
         """Упрощенная версия метода извлечения относительного пути из FTP Backup"""
         try:
             normalized_path = file_path.replace('/', '\\')
-            project_roots = [
-                'var\\www\\',
-                'www\\',
-                'public_html\\',
-                'local\\',
-                'htdocs\\',
-                'home\\'
-            ]
             
-            for root in project_roots:
+            for root in PROJECT_ROOTS:
                 if root in normalized_path:
                     relative_path = normalized_path.split(root, 1)[1]
                     return relative_path.replace('\\', '/')
@@ -261,8 +247,32 @@ class FtpBackupMiniPanelCommand(sublime_plugin.TextCommand):
         except:
             return os.path.basename(file_path)
     
+    def resolve_project(self, backup_root, file_path):
+        """
+        Определяет проект (сервер) только по сохраненным сопоставлениям и текущему серверу.
+        Никогда не запрашивает имя у пользователя, поэтому не блокирует интерфейс
+        """
+        mapping_path = os.path.join(backup_root, 'site_name_mapping.json')
+        try:
+            if os.path.exists(mapping_path):
+                with open(mapping_path, 'r', encoding='utf-8') as f:
+                    mappings = json.load(f)
+                
+                # Корневой путь проекта определяется так же, как в FtpBackupManager
+                normalized_path = file_path.replace('/', '\\')
+                for root in PROJECT_ROOTS:
+                    if root in normalized_path:
+                        project_root = normalized_path.split(root)[0] + root
+                        if project_root in mappings:
+                            return mappings[project_root]
+                        break
+        except Exception as e:
+            print(f"Ошибка чтения сопоставлений проектов: {str(e)}")
+        
+        return getattr(ftp_backup, 'CURRENT_SERVER', None)
+    
     def get_project_tasks(self, file_path):
-        """Получает список задач для текущего проекта (сервера)"""
+        """Получает список задач для текущего проекта (сервера) из индекса задач"""
         try:
             # Сначала определяем текущий проект/сервер
             settings = sublime.load_settings('ftp_backup.sublime-settings')
@@ -271,19 +281,7 @@ class FtpBackupMiniPanelCommand(sublime_plugin.TextCommand):
             if not backup_root or not os.path.exists(backup_root):
                 return []
             
-            # Определяем имя сервера из файла или используем текущий
-            try:
-                # Создаем временный экземпляр FtpBackupManager для определения имени сервера
-                backup_manager = ftp_backup.FtpBackupManager(backup_root)
-                server_name = backup_manager.extract_site_name(file_path)
-                
-                # Если не удалось определить, используем текущий сервер
-                if not server_name and hasattr(ftp_backup, 'CURRENT_SERVER'):
-                    server_name = ftp_backup.CURRENT_SERVER
-            except:
-                # В случае ошибки, используем текущий сервер
-                server_name = ftp_backup.CURRENT_SERVER if hasattr(ftp_backup, 'CURRENT_SERVER') else None
-            
+            server_name = self.resolve_project(backup_root, file_path)
             if not server_name:
                 return []
             
@@ -312,37 +310,29 @@ class FtpBackupMiniPanelCommand(sublime_plugin.TextCommand):
             if not server_folder:
                 return []
             
-            # Теперь ищем задачи для этого сервера
-            server_path = os.path.join(backup_root, server_folder)
-            tasks = []
-            
-            # Просматриваем все подпапки в папке сервера
-            for month_folder in os.listdir(server_path):
-                month_path = os.path.join(server_path, month_folder)
-                
-                if not os.path.isdir(month_path):
-                    continue
-                
-                # Ищем папки задач в папке месяца
-                for item in os.listdir(month_path):
-                    item_path = os.path.join(month_path, item)
-                    
-                    # Игнорируем служебные папки 'before' и 'after'
-                    if item != 'before' and item != 'after' and os.path.isdir(item_path):
-                        tasks.append(item)
-            
-            # Удаляем дубликаты и сортируем
-            unique_tasks = sorted(list(set(tasks)))
-            return unique_tasks
+            # Задачи сервера берутся из индекса задач (при первом запуске индекс строится)
+            catalog = ftp_backup_catalog.get_catalog(backup_root)
+            if not catalog.has_task_index():
+                catalog.rebuild_tasks()
+            return sorted(catalog.get_tasks(server_folder))
             
         except Exception as e:
             print(f"Ошибка при получении списка задач: {str(e)}")
             return []
     
     def show_task_selection(self, file_path):
-        """Показывает меню выбора задачи через встроенные средства Sublime Text"""
+        """
+        Показывает меню выбора задачи через встроенные средства Sublime Text.
+        Список задач собирается в фоновом потоке, меню открывается, когда он готов
+        """
+        sublime.status_message("FTP Backup: Загрузка списка задач...")
+        sublime.set_timeout_async(lambda: self.load_tasks(file_path), 0)
+    
+    def load_tasks(self, file_path):
         tasks = self.get_project_tasks(file_path)
-        
+        sublime.set_timeout(lambda: self.show_tasks_panel(tasks, file_path), 0)
+    
+    def show_tasks_panel(self, tasks, file_path):
         if not tasks:
             sublime.status_message("FTP Backup: Нет доступных задач для этого проекта")
             return
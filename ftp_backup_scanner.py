@@ -0,0 +1,149 @@
+import os
+import re
+import collections
+import concurrent.futures
+
+# Общий сканер папок бэкапов на основе os.scandir.
+# DirEntry уже знает тип записи, а stat выполняется один раз на файл,
+# поэтому вместо isdir/getmtime/getsize на каждый файл остается один системный вызов
+
+# Файл в папке бэкапов. mtime копии совпадает с mtime исходного файла (shutil.copy2);
+# ctime - время создания копии в Windows, но время изменения inode в POSIX
+FileRecord = collections.namedtuple('FileRecord', ['path', 'relpath', 'name', 'size', 'mtime', 'ctime'])
+
+# Папка задачи: site/month/task, статистика по файлам в before/after
+TaskRecord = collections.namedtuple('TaskRecord', ['site', 'month', 'name', 'path', 'file_count', 'total_size', 'mod_time'])
+
+# Папки, которые не являются задачами
+NON_TASK_FOLDERS = ('before', 'after', 'logs')
+
+# Служебные папки в корне бэкапов: логи, отчеты и снимки файлов перед восстановлением
+SERVICE_FOLDERS = ('logs', 'reports', 'snapshots')
+
+# Папка месяца в пути бэкапа, например "October 2024"
+MONTH_FOLDER_RE = re.compile(r'^[^\W\d_]+ \d{4}$')
+
+def default_workers():
+    """Количество потоков для параллельного обхода"""
+    return min(8, os.cpu_count() or 1)
+
+def _file_record(entry, relpath):
+    """Создает FileRecord из DirEntry (один stat на файл)"""
+    try:
+        stat = entry.stat()
+        return FileRecord(entry.path, relpath, entry.name, stat.st_size, stat.st_mtime, stat.st_ctime)
+    except OSError:
+        return FileRecord(entry.path, relpath, entry.name, 0, 0, 0)
+
+def list_subdirs(folder_path, skip=()):
+    """Возвращает отсортированные имена подпапок (без stat для каждой записи)"""
+    try:
+        with os.scandir(folder_path) as entries:
+            return sorted(entry.name for entry in entries
+                          if entry.name not in skip and entry.is_dir(follow_symlinks=False))
+    except OSError:
+        return []
+
+def list_files(folder_path):
+    """Возвращает FileRecord для файлов папки без обхода подпапок"""
+    try:
+        with os.scandir(folder_path) as entries:
+            return [_file_record(entry, entry.name) for entry in entries if entry.is_file()]
+    except OSError:
+        return []
+
+def iter_files(folder_path, exclude=None, sort=False):
+    """
+    Рекурсивно обходит папку и возвращает FileRecord для каждого файла.
+    exclude(name, relpath): вернуть True, чтобы пропустить запись (папки отсекаются целиком)
+    sort: обход в алфавитном порядке (нужен для воспроизводимых архивов)
+    """
+    stack = ['']
+    while stack:
+        relative_dir = stack.pop()
+        current_dir = os.path.join(folder_path, relative_dir) if relative_dir else folder_path
+        try:
+            with os.scandir(current_dir) as iterator:
+                entries = list(iterator)
+        except OSError:
+            continue
+        if sort:
+            entries.sort(key=lambda e: e.name)
+
+        subdirs = []
+        for entry in entries:
+            relpath = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+            if exclude is not None and exclude(entry.name, relpath):
+                continue
+
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(relpath)
+            elif entry.is_file():
+                yield _file_record(entry, relpath)
+
+        # Обратный порядок, чтобы папки обходились по алфавиту
+        stack.extend(reversed(subdirs))
+
+def describe_backup_path(backup_root, backup_path):
+    """
+    Определяет сайт, задачу, тип версии (before/after) и относительный путь
+    по расположению файла: site/[month/][task/]before|after/relative_path
+    """
+    parts = os.path.relpath(backup_path, backup_root).replace('\\', '/').split('/')
+    for position in range(1, len(parts) - 1):
+        if parts[position] in ('before', 'after'):
+            between = parts[1:position]
+            task = ''
+            if len(between) >= 2 or (between and not MONTH_FOLDER_RE.match(between[0])):
+                task = between[-1]
+            return {
+                'site': parts[0],
+                'task': task,
+                'kind': parts[position],
+                'relative_path': '/'.join(parts[position + 1:])
+            }
+    return None
+
+def iter_backup_copies(backup_root):
+    """Обходит все копии файлов в папках before/after: пары (FileRecord, описание копии)"""
+    # Служебные папки пропускаются только в корне бэкапов: папка logs внутри сайта - это файлы сайта
+    for record in iter_files(backup_root, exclude=lambda name, relpath: relpath in SERVICE_FOLDERS):
+        info = describe_backup_path(backup_root, record.path)
+        if info is not None:
+            yield record, info
+
+def scan_site_tasks(backup_root, site_folder):
+    """Сканирует задачи одного сайта: backup_root/site/month/task"""
+    tasks = []
+    site_path = os.path.join(backup_root, site_folder)
+    for month_folder in list_subdirs(site_path):
+        month_path = os.path.join(site_path, month_folder)
+        for task_name in list_subdirs(month_path, skip=NON_TASK_FOLDERS):
+            task_path = os.path.join(month_path, task_name)
+            file_count = 0
+            total_size = 0
+            mod_time = 0
+            for kind in ('before', 'after'):
+                for record in iter_files(os.path.join(task_path, kind)):
+                    file_count += 1
+                    total_size += record.size
+                    if record.mtime > mod_time:
+                        mod_time = record.mtime
+            tasks.append(TaskRecord(site_folder, month_folder, task_name, task_path, file_count, total_size, mod_time))
+    return tasks
+
+def scan_tasks(backup_root, max_workers=None):
+    """
+    Сканирует задачи всех сайтов. Сайты обходятся параллельно в пуле потоков:
+    на больших корневых папках ожидание диска перекрывается
+    """
+    sites = list_subdirs(backup_root, skip=SERVICE_FOLDERS)
+    if not sites:
+        return []
+
+    workers = max(1, min(max_workers or default_workers(), len(sites)))
+    tasks = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for site_tasks in executor.map(lambda site: scan_site_tasks(backup_root, site), sites):
+            tasks.extend(site_tasks)
+    return tasks
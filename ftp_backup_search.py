@@ -0,0 +1,435 @@
+import sublime
+import sublime_plugin
+import os
+import re
+import json
+import bisect
+import heapq
+import threading
+import collections
+from datetime import datetime
+
+# Подключение к основному модулю FTP Backup и каталогу бэкапов
+try:
+    from . import ftp_backup
+    from . import ftp_backup_catalog
+except ImportError:
+    import ftp_backup
+    import ftp_backup_catalog
+
+# Запись поискового индекса: kind - 'task', 'site' или 'file'
+SearchEntry = collections.namedtuple('SearchEntry', ['kind', 'title', 'detail', 'site', 'name', 'path'])
+
+# Сколько кандидатов ранжируется для коротких запросов, совпадающих почти со всем
+MAX_CANDIDATES = 1000
+
+# Во сколько раз проверка слов одной записи в цикле дороже обработки одного вхождения при пересечении
+# множеств: список вхождений слова пересекается заранее, если он не длиннее числа записей, которые
+# пришлось бы проверить, умноженного на это значение; иначе слово проверяется по словам записей
+INTERSECT_RATIO = 10
+
+# Разделители слов в строках записей и в запросе
+_TOKEN_SPLIT_RE = re.compile(r'[\s/\\._\-·]+')
+
+# Задержка перестроения устаревшего индекса, мс: изменения каталога за это время
+# (серия сохранений) учитываются одним перестроением
+SEARCH_REBUILD_DELAY = 1000
+
+# Индексы по корневым папкам бэкапов
+_INDEXES = {}
+# Запланированные перестроения: корневая папка -> функции, ожидающие новый индекс
+_PENDING_REBUILDS = {}
+_INDEXES_LOCK = threading.Lock()
+
+def _index_stamp(catalog, config_path):
+    """Отметка актуальности индекса: номер изменения каталога и время изменения backup_config.json"""
+    try:
+        config_mtime = os.path.getmtime(config_path)
+    except OSError:
+        config_mtime = None
+    return (catalog.get_generation(), config_mtime)
+
+def get_search_index(backup_root, on_rebuilt=None):
+    """
+    Возвращает поисковый индекс для корневой папки бэкапов.
+    Индекс строится сразу только при первом обращении. Если после построения изменился каталог
+    или backup_config.json, возвращается прежний индекс, а новый строится в фоне с задержкой
+    SEARCH_REBUILD_DELAY; on_rebuilt(index) вызывается из фонового потока, когда он готов
+    """
+    catalog = ftp_backup_catalog.get_catalog(backup_root)
+    config_path = os.path.join(backup_root, 'backup_config.json')
+    stamp = _index_stamp(catalog, config_path)
+
+    key = os.path.normcase(os.path.abspath(backup_root))
+    schedule = False
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        if index is None:
+            index = SearchIndex.build(catalog, config_path, stamp)
+            _INDEXES[key] = index
+        elif index.stamp != stamp:
+            callbacks = _PENDING_REBUILDS.get(key)
+            if callbacks is None:
+                callbacks = _PENDING_REBUILDS[key] = []
+                schedule = True
+            if on_rebuilt:
+                callbacks.append(on_rebuilt)
+    if schedule:
+        sublime.set_timeout_async(lambda: _rebuild_search_index(backup_root, key), SEARCH_REBUILD_DELAY)
+    return index
+
+def _rebuild_search_index(backup_root, key):
+    """Отложенное перестроение индекса; отметка берется в момент построения, чтобы учесть все изменения"""
+    try:
+        catalog = ftp_backup_catalog.get_catalog(backup_root)
+        config_path = os.path.join(backup_root, 'backup_config.json')
+        index = SearchIndex.build(catalog, config_path, _index_stamp(catalog, config_path))
+    except Exception as e:
+        print(f"[FTP Backup ERROR] Ошибка перестроения поискового индекса: {str(e)}")
+        index = None
+
+    with _INDEXES_LOCK:
+        if index is not None:
+            _INDEXES[key] = index
+        callbacks = _PENDING_REBUILDS.pop(key, [])
+    if index is not None:
+        for callback in callbacks:
+            callback(index)
+
+class SearchIndex:
+    """
+    Поисковый индекс по задачам, сайтам и относительным путям файлов.
+    Строки записей разбиваются на слова (части пути, имени, расширение);
+    слова запроса нечетко сопоставляются со словарем уникальных слов,
+    который на порядки меньше числа записей. Кандидаты - пересечение списков вхождений
+    слов запроса, начиная с самого редкого (очень частые слова проверяются по словам записи);
+    если их больше MAX_CANDIDATES, первыми берутся записи, где самое редкое слово входит в имя файла. Если слово запроса не совпало ни с одним словом словаря (например, "bsktphp"),
+    выполняется поиск подпоследовательности по полному тексту
+    """
+
+    def __init__(self, entries, stamp=None):
+        self.entries = entries
+        self.stamp = stamp
+        self.lines = [entry.title.lower() for entry in entries]
+        self.tokens = []
+
+        postings = {}
+        name_postings = {}
+        for index, line in enumerate(self.lines):
+            tokens = set(tokenize(line))
+            self.tokens.append(tuple(tokens))
+            for token in tokens:
+                postings.setdefault(token, []).append(index)
+            for token in set(tokenize(entries[index].name.lower().rsplit('/', 1)[-1])):
+                name_postings.setdefault(token, []).append(index)
+        self.postings = postings
+        self.name_postings = name_postings
+
+        # Словарь и полный текст: по строке на слово/запись для поиска регулярными выражениями
+        self.vocabulary = sorted(postings)
+        self.vocabulary_text = "\n".join(self.vocabulary)
+        self.vocabulary_offsets = _line_offsets(self.vocabulary)
+        self.text = "\n".join(self.lines)
+        self.offsets = _line_offsets(self.lines)
+
+    @classmethod
+    def build(cls, catalog, config_path, stamp=None):
+        """
+        Строит индекс из каталога: задачи - из индекса задач, файлы - из индекса версий
+        (запись на файл и сайт, путь - к самой новой копии). Пока индекс версий не построен,
+        он строится в фоне, а файлы берутся из backup_config.json (последний бэкап каждого файла)
+        """
+        entries = []
+        sites = set()
+        with catalog.lock:
+            site_tasks = {site: dict(tasks) for site, tasks in catalog.data.get('tasks', {}).items()}
+        for site, tasks in sorted(site_tasks.items()):
+            sites.add(site)
+            for task_name, info in sorted(tasks.items()):
+                entries.append(SearchEntry(
+                    'task', f"{task_name} {site}", f"Задача · {site} · {info['file_count']} файлов",
+                    site, task_name, info['paths'][-1] if info['paths'] else None
+                ))
+
+        if catalog.has_version_index():
+            entries.extend(_file_entries(catalog))
+        else:
+            catalog.schedule_version_rebuild()
+            entries.extend(_config_file_entries(config_path))
+
+        for site in sorted(sites):
+            entries.append(SearchEntry(
+                'site', site, "Сайт", site, site, os.path.join(catalog.backup_root, site)
+            ))
+        return cls(entries, stamp)
+
+    def _match_tokens(self, word):
+        """Слова словаря, совпадающие со словом запроса, с оценкой совпадения (лучшие первыми)"""
+        matches = []
+        for match in re.finditer(_subsequence_pattern(word), self.vocabulary_text):
+            index = bisect.bisect_right(self.vocabulary_offsets, match.start()) - 1
+            token = self.vocabulary[index]
+            if matches and matches[-1][1] == token:
+                continue
+            if token == word:
+                score = 100
+            elif token.startswith(word):
+                score = 80
+            elif word in token:
+                score = 60
+            else:
+                # Чем плотнее подпоследовательность, тем выше оценка
+                score = 20 + int(30 * len(word) / (match.end() - match.start()))
+            matches.append((score, token))
+        matches.sort(key=lambda item: (-item[0], len(item[1])))
+        return matches
+
+    def _word_candidates(self, word_matches):
+        """
+        Кандидаты по спискам вхождений слов словаря.
+        word_matches: совпадения слов словаря для каждого слова запроса, первым - самое редкое слово.
+        Записи самого редкого слова сначала пересекаются (на уровне C) со списками вхождений
+        остальных слов; списки слов, которые встречаются намного чаще самого редкого, не обходятся -
+        такие слова проверяются по словам самой записи. Если записей со всеми словами больше
+        MAX_CANDIDATES, берутся первые из них, начиная с записей, где самое редкое слово входит в имя файла.
+        Возвращает индекс записи -> суммарная оценка
+        """
+        rarest_size = sum(len(self.postings[token]) for _, token in word_matches[0])
+        candidates = None
+        other_words = []
+        for matches in word_matches[1:]:
+            size = sum(len(self.postings[token]) for _, token in matches)
+            # Сколько записей самого редкого слова придется проверить, чтобы набрать MAX_CANDIDATES с этим словом
+            checks = min(rarest_size, MAX_CANDIDATES * len(self.entries) // max(size, 1))
+            if size > checks * INTERSECT_RATIO:
+                other_words.append({token for _, token in matches})
+                continue
+            if candidates is None:
+                candidates = set().union(*(self.postings[token] for _, token in word_matches[0]))
+            candidates = set().union(*(candidates.intersection(self.postings[token]) for _, token in matches))
+            if not candidates:
+                return {}
+
+        if candidates is not None and other_words and len(candidates) < rarest_size:
+            # Пересечение уже меньше списков самого редкого слова: частые слова проверяются только у его записей
+            candidates = {index for index in candidates
+                          if not any(words.isdisjoint(self.tokens[index]) for words in other_words)}
+            other_words = []
+        if candidates is None or other_words or len(candidates) > MAX_CANDIDATES:
+            candidates = self._preferred_candidates(word_matches[0], candidates, other_words)
+
+        word_scores = [{token: score for score, token in matches} for matches in word_matches]
+        scores = {}
+        for index in candidates:
+            tokens = self.tokens[index]
+            scores[index] = sum(max(map(words.__getitem__, words.keys() & tokens)) for words in word_scores)
+        return scores
+
+    def _preferred_candidates(self, matches, candidates=None, other_words=()):
+        """
+        До MAX_CANDIDATES записей с самым редким словом запроса: сначала записи, где оно входит в имя файла,
+        и лучшие совпадения слова. candidates: допустимые записи (None - любые);
+        other_words: слова словаря для остальных слов запроса, у записи должно быть хотя бы одно из каждой группы
+        """
+        selected = {}
+        for _, token in matches:
+            for postings in (self.name_postings.get(token, ()), self.postings[token]):
+                for index in postings:
+                    if index in selected or (candidates is not None and index not in candidates):
+                        continue
+                    tokens = self.tokens[index]
+                    for words in other_words:
+                        if words.isdisjoint(tokens):
+                            break
+                    else:
+                        selected[index] = None
+                        if len(selected) >= MAX_CANDIDATES:
+                            return selected
+        return selected
+
+    def _scan_candidates(self, query):
+        """Поиск подпоследовательности по полному тексту: индекс записи -> оценка"""
+        scores = {}
+        for match in re.finditer(_subsequence_pattern(query), self.text):
+            index = bisect.bisect_right(self.offsets, match.start()) - 1
+            if index in scores:
+                continue
+            scores[index] = 20 + int(30 * len(query) / (match.end() - match.start()))
+            if len(scores) >= MAX_CANDIDATES:
+                break
+        return scores
+
+    def search(self, query, limit=50):
+        """Возвращает до limit лучших записей по запросу"""
+        query = query.strip().lower()
+        words = tokenize(query)
+        if not words:
+            return []
+
+        word_matches = []
+        for word in set(words):
+            matches = self._match_tokens(word)
+            if not matches:
+                # Слово не совпало ни с одним словом словаря: ищем по полному тексту
+                candidates = self._scan_candidates(query.replace(' ', ''))
+                break
+            word_matches.append(matches)
+        else:
+            # Перебираются вхождения самого редкого слова запроса
+            word_matches.sort(key=lambda matches: sum(len(self.postings[token]) for _, token in matches))
+            candidates = self._word_candidates(word_matches)
+
+        return [self.entries[index] for index in heapq.nlargest(
+            limit, candidates, key=lambda index: self._rank(query, words, index, candidates[index])
+        )]
+
+    def _rank(self, query, words, index, score):
+        """Итоговая оценка: совпадение всей строки запроса, имя файла и тип записи дают бонус"""
+        entry = self.entries[index]
+        line = self.lines[index]
+        if query in line:
+            score += 50
+        base_name = entry.name.lower().rsplit('/', 1)[-1]
+        if words[-1] in base_name:
+            score += 40
+        if entry.kind == 'task':
+            score += 30
+        return (score - len(line) // 10, -index)
+
+def _file_entries(catalog):
+    """Записи файлов по индексу версий каталога: одна на файл и сайт, версии идут от старых к новым"""
+    latest = {}
+    counts = collections.Counter()
+    for relative_path, version in catalog.iter_versions():
+        key = (relative_path, version.get('site', ''))
+        latest[key] = version
+        counts[key] += 1
+    for (relative_path, site), version in latest.items():
+        backup_time = datetime.fromtimestamp(version['time']).strftime('%Y-%m-%d %H:%M:%S')
+        yield SearchEntry(
+            'file', f"{relative_path} {site}", f"Файл · {site} · {backup_time} · версий: {counts[relative_path, site]}",
+            site, relative_path, version['path']
+        )
+
+def _config_file_entries(config_path):
+    """Записи файлов по backup_config.json (пока индекс версий каталога не построен)"""
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            backup_config = json.load(f)
+    except (OSError, ValueError):
+        backup_config = {}
+    for relative_path, file_info in sorted(backup_config.items()):
+        site = file_info.get('site', '')
+        backup_dir = file_info.get('backup_dir', '')
+        backup_path = os.path.join(backup_dir, os.path.basename(relative_path)) if backup_dir else None
+        yield SearchEntry(
+            'file', f"{relative_path} {site}", f"Файл · {site} · {file_info.get('last_backup_time', '')}",
+            site, relative_path, backup_path
+        )
+
+def tokenize(text):
+    """Разбивает строку на слова: части пути, имени файла и расширение"""
+    return [token for token in _TOKEN_SPLIT_RE.split(text) if token]
+
+def _subsequence_pattern(text):
+    """
+    Регулярное выражение для подпоследовательности в пределах одной строки.
+    Отрицательные классы символов исключают возвраты: берется самое раннее совпадение
+    """
+    return re.escape(text[0]) + ''.join(
+        f"[^\\n{re.escape(ch)}]*{re.escape(ch)}" for ch in text[1:]
+    )
+
+def _line_offsets(lines):
+    """Смещения начала строк в тексте, склеенном через перевод строки"""
+    offsets = []
+    offset = 0
+    for line in lines:
+        offsets.append(offset)
+        offset += len(line) + 1
+    return offsets
+
+class FtpBackupFindBackupCommand(sublime_plugin.WindowCommand):
+    """Поиск задач, сайтов и файлов в бэкапах с результатами по мере ввода"""
+
+    def run(self):
+        settings = sublime.load_settings('ftp_backup.sublime-settings')
+        backup_root = settings.get('backup_root')
+        if not backup_root or not os.path.exists(backup_root):
+            sublime.status_message("FTP Backup: Папка для бэкапов не найдена")
+            return
+
+        self.index = None
+        self.query = ""
+        self.results = []
+        self.panel = self.window.create_output_panel("ftp_backup_search")
+        self.window.show_input_panel(
+            "Найти бэкап (задача, сайт или путь к файлу):",
+            "",
+            self.on_done,
+            self.on_change,
+            None
+        )
+
+        # Индекс строится (или берется готовый) в фоне, поле ввода доступно сразу
+        sublime.set_timeout_async(lambda: self.load_index(backup_root), 0)
+
+    def load_index(self, backup_root):
+        # Устаревший индекс показывается сразу и заменяется, когда фоновое перестроение завершится
+        index = get_search_index(
+            backup_root,
+            on_rebuilt=lambda rebuilt: sublime.set_timeout(lambda: self.on_index_ready(rebuilt), 0)
+        )
+        sublime.set_timeout(lambda: self.on_index_ready(index), 0)
+
+    def on_index_ready(self, index):
+        """Показывает результаты для уже введенного запроса"""
+        self.index = index
+        if self.query:
+            self.on_change(self.query)
+
+    def on_change(self, query):
+        """Обновляет результаты в панели вывода при каждом изменении запроса"""
+        self.query = query
+        if self.index is None:
+            lines = ["Построение поискового индекса..."]
+        else:
+            self.results = self.index.search(query)
+            lines = [f"Найдено: {len(self.results)}" + (" (показаны лучшие)" if len(self.results) >= 50 else "")]
+            for entry in self.results:
+                lines.append(f"{entry.name}    [{entry.detail}]")
+        self.panel.run_command("select_all")
+        self.panel.run_command("right_delete")
+        self.panel.run_command("append", {"characters": "\n".join(lines) + "\n"})
+        self.window.run_command("show_panel", {"panel": "output.ftp_backup_search"})
+
+    def on_done(self, query):
+        """После ввода предлагает выбрать одну из найденных записей"""
+        if self.index is None:
+            sublime.status_message("FTP Backup: Поисковый индекс еще строится, повторите поиск")
+            return
+        self.results = self.index.search(query)
+        self.window.run_command("hide_panel", {"panel": "output.ftp_backup_search"})
+        if not self.results:
+            sublime.status_message("FTP Backup: Ничего не найдено")
+            return
+        self.window.show_quick_panel(
+            [[entry.name, entry.detail] for entry in self.results],
+            self.on_result_selected
+        )
+
+    def on_result_selected(self, index):
+        """Задача становится текущей, файл открывается из бэкапа, папка сайта открывается в боковой панели"""
+        if index == -1:
+            return
+        entry = self.results[index]
+        if entry.kind == 'task':
+            ftp_backup.CURRENT_TASK_NUMBER = entry.name
+            sublime.status_message(f"FTP Backup: Задача изменена на {entry.name}")
+        elif entry.kind == 'file':
+            if entry.path and os.path.exists(entry.path):
+                self.window.open_file(entry.path)
+            else:
+                sublime.status_message(f"FTP Backup: Бэкап файла не найден: {entry.name}")
+        elif entry.path and os.path.isdir(entry.path):
+            self.window.run_command("open_dir", {"dir": entry.path})
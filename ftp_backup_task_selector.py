@@ -30,6 +30,22 @@ except (ImportError, ValueError):
         except ImportError:
             ftp_backup = None
 
+# Каталог бэкапов (индекс задач) и общий сканер папок
+try:
+    from . import ftp_backup_catalog
+    from . import ftp_backup_scanner
+except ImportError:
+    import ftp_backup_catalog
+    import ftp_backup_scanner
+
+# Последний построенный список задач по (корневая папка, сайт):
+# панель выбора задачи открывается сразу с ним, пока актуальный список считается в фоне
+_TASK_LIST_CACHE = {}
+
+# Сайт, определенный для папки файла при последнем обновлении: (корневая папка, папка файла) -> сайт.
+# Сайт определяется в фоне, поэтому при открытии панели берется отсюда
+_SITE_CACHE = {}
+
 class TaskSelectorHelper:
     """
     Вспомогательный класс для выбора задач
@@ -49,35 +65,103 @@ class TaskSelectorHelper:
         self.callback = callback
         self.file_path = file_path
         
-        # Определяем текущий сайт
-        if file_path:
-            # Получаем текущий сервер
-            settings = sublime.load_settings('ftp_backup.sublime-settings')
-            backup_root = settings.get('backup_root')
-            if backup_root:
-                backup_manager = ftp_backup.FtpBackupManager(backup_root)
-                self.current_site = backup_manager.extract_site_name(file_path)
-            else:
-                self.current_site = None
-        else:
-            self.current_site = None
+        # Текущий сайт определяется в фоне при обновлении списка задач (_refresh_tasks):
+        # чтение конфигурации и сопоставлений не задерживает открытие панели
+        self.current_site = None
     
     def show_task_selector(self):
-        """Показывает выпадающий список для выбора задачи"""
-        # Получаем список всех задач для текущего проекта
-        tasks = self.get_project_tasks()
+        """
+        Показывает выпадающий список для выбора задачи
+        Панель открывается сразу с последним построенным списком, а актуальный список
+        считается в фоне; панель обновляется, только если результат отличается
+        """
+        settings = sublime.load_settings('ftp_backup.sublime-settings')
+        self.backup_root = settings.get('backup_root')
+        self.site_key = (self.backup_root, os.path.dirname(self.file_path) if self.file_path else None)
+        self.panel_generation = 0
+        self.panel_open = True
+        self.highlighted_task = None
         
-        if tasks:
-            # Используем show_quick_panel с параметрами для лучшего отображения
-            self.window.show_quick_panel(
-                # Для каждой задачи отправляем полное описание
-                items=[task[1] for task in tasks],
-                on_select=lambda index: self.on_task_selected(index, tasks),
-                flags=sublime.MONOSPACE_FONT,  # Используем моноширинный шрифт для лучшего выравнивания
-                placeholder="Выберите задачу для проекта или создайте новую..."
-            )
+        # Сайт папки файла еще не определялся: кэш списка задач может относиться к другому сайту
+        cached_tasks = None
+        if self.site_key in _SITE_CACHE:
+            self.current_site = _SITE_CACHE[self.site_key]
+            cached_tasks = _TASK_LIST_CACHE.get((self.backup_root, self.current_site))
+        if cached_tasks:
+            self._show_tasks_panel(cached_tasks)
         else:
+            # Список еще не строился: показываем только создание новой задачи
+            self._show_tasks_panel([["__new__", "✚ Создать новую задачу..."]], "Загрузка списка задач...")
+        
+        sublime.set_timeout_async(self._refresh_tasks, 0)
+    
+    def _show_tasks_panel(self, tasks, placeholder="Выберите задачу для проекта или создайте новую..."):
+        """Показывает (или заменяет) панель выбора задачи, сохраняя выделенную задачу"""
+        self.panel_generation += 1
+        generation = self.panel_generation
+        self.shown_tasks = tasks
+        
+        selected_index = -1
+        if self.highlighted_task is not None:
+            for index, task in enumerate(tasks):
+                if task[0] == self.highlighted_task:
+                    selected_index = index
+                    break
+        
+        # Используем show_quick_panel с параметрами для лучшего отображения
+        self.window.show_quick_panel(
+            # Для каждой задачи отправляем полное описание
+            items=[task[1] for task in tasks],
+            on_select=lambda index: self._on_panel_select(index, tasks, generation),
+            flags=sublime.MONOSPACE_FONT,  # Используем моноширинный шрифт для лучшего выравнивания
+            selected_index=selected_index,
+            on_highlight=lambda index: self._on_panel_highlight(index, tasks, generation),
+            placeholder=placeholder
+        )
+    
+    def _on_panel_select(self, index, tasks, generation):
+        """Обработчик выбора; вызовы от замененной панели игнорируются"""
+        if generation != self.panel_generation:
+            return
+        self.panel_open = False
+        self.on_task_selected(index, tasks)
+    
+    def _on_panel_highlight(self, index, tasks, generation):
+        """Запоминает выделенную задачу, чтобы сохранить выделение при обновлении панели"""
+        if generation == self.panel_generation and 0 <= index < len(tasks):
+            self.highlighted_task = tasks[index][0]
+    
+    def _resolve_current_site(self):
+        """Определяет сайт текущего файла по сохраненным сопоставлениям, без запроса имени у пользователя"""
+        if not self.file_path or not self.backup_root:
+            return None
+        backup_manager = ftp_backup.FtpBackupManager(self.backup_root)
+        return backup_manager.extract_site_name(self.file_path, prompt_if_failed=False)
+    
+    def _refresh_tasks(self):
+        """Определяет сайт и пересчитывает список задач в фоновом потоке"""
+        try:
+            self.current_site = self._resolve_current_site()
+        except Exception as e:
+            print(f"Ошибка определения сайта для выбора задачи: {str(e)}")
+            self.current_site = None
+        _SITE_CACHE[self.site_key] = self.current_site
+        
+        tasks = self.get_project_tasks()
+        if tasks:
+            _TASK_LIST_CACHE[(self.backup_root, self.current_site)] = tasks
+        sublime.set_timeout(lambda: self._apply_refreshed_tasks(tasks), 0)
+    
+    def _apply_refreshed_tasks(self, tasks):
+        """Обновляет открытую панель, если список задач изменился"""
+        if not self.panel_open or tasks == self.shown_tasks:
+            return
+        
+        if not tasks:
             # Если задачи не найдены, показываем стандартный диалог
+            self.panel_open = False
+            self.panel_generation += 1
+            self.window.run_command("hide_overlay")
             self.window.show_input_panel(
                 f"Введите номер/имя задачи для проекта {self.current_site or ''}:",
                 "",
@@ -85,6 +169,9 @@ class TaskSelectorHelper:
                 None,
                 None
             )
+            return
+        
+        self._show_tasks_panel(tasks)
     
     def get_project_tasks(self):
         """
@@ -107,125 +194,68 @@ class TaskSelectorHelper:
             site_folder = self._find_site_folder(backup_root, self.current_site)
             if not site_folder:
                 # Если папка сайта не найдена, пробуем найти по части имени
-                for folder in os.listdir(backup_root):
-                    folder_path = os.path.join(backup_root, folder)
-                    if os.path.isdir(folder_path) and folder != "logs":
-                        # Проверяем, содержит ли имя папки часть имени сайта
-                        if self.current_site.lower() in folder.lower() or folder.lower() in self.current_site.lower():
-                            site_folder = folder
-                            break
+                for folder in ftp_backup_scanner.list_subdirs(backup_root, skip=ftp_backup_scanner.SERVICE_FOLDERS):
+                    # Проверяем, содержит ли имя папки часть имени сайта
+                    if self.current_site.lower() in folder.lower() or folder.lower() in self.current_site.lower():
+                        site_folder = folder
+                        break
             
             # Если сайт все еще не найден, вернем все задачи
             if not site_folder:
                 return self.get_all_tasks()
             
-            # Словарь для хранения информации о задачах
-            # Ключ - имя задачи, значение - словарь с информацией
-            tasks_info = {}
-            
-            # Путь к папке сайта
-            site_path = os.path.join(backup_root, site_folder)
-            
-            # Проверяем подпапки сайта (месяцы или задачи)
-            for month_folder in os.listdir(site_path):
-                month_path = os.path.join(site_path, month_folder)
-                
-                if not os.path.isdir(month_path):
-                    continue
-                
-                # Ищем задачи в папке месяца
-                for item in os.listdir(month_path):
-                    item_path = os.path.join(month_path, item)
-                    
-                    # Проверяем является ли папка задачей
-                    # Задача обычно имеет имя, начинающееся с task_ или это папка, не являющаяся before/after
-                    if os.path.isdir(item_path) and item not in ['before', 'after', 'logs']:
-                        # Если задача еще не в словаре, добавляем её
-                        if item not in tasks_info:
-                            tasks_info[item] = {
-                                'name': item,
-                                'sites': set([site_folder]),  # Сайты, где используется задача
-                                'file_count': 0,  # Общее количество файлов
-                                'mod_time': 0,    # Время последней модификации
-                                'paths': []       # Пути к папкам задачи
-                            }
-                        
-                        # Добавляем путь к папке задачи
-                        tasks_info[item]['paths'].append(item_path)
-                        
-                        # Подсчитываем файлы и проверяем время модификации
-                        for root, dirs, files in os.walk(item_path):
-                            tasks_info[item]['file_count'] += len(files)
-                            
-                            # Проверяем время модификации каждого файла
-                            for file in files:
-                                file_path = os.path.join(root, file)
-                                try:
-                                    mtime = os.path.getmtime(file_path)
-                                    if mtime > tasks_info[item]['mod_time']:
-                                        tasks_info[item]['mod_time'] = mtime
-                                except:
-                                    pass
-            
-            # Преобразуем информацию о задачах в список для отображения
-            display_tasks = []
-            
-            # Добавляем текущую задачу в начало списка, если она существует и в этом проекте
-            try:
-                current_task = ftp_backup.CURRENT_TASK_NUMBER
-                if current_task and current_task in tasks_info:
-                    info = tasks_info[current_task]
-                    
-                    # Форматируем время последней модификации
-                    if info['mod_time'] > 0:
-                        mod_time_str = datetime.fromtimestamp(info['mod_time']).strftime('%d.%m.%Y %H:%M')
-                    else:
-                        mod_time_str = "неизвестно"
-                    
-                    # Формируем строку для отображения
-                    sites_str = ", ".join(sorted(info['sites']))
-                    if len(sites_str) > 20:
-                        sites_str = sites_str[:17] + "..."
-                    
-                    # Добавляем задачу с дополнительной информацией
-                    display_task = f"★ {current_task} [{info['file_count']} файлов, {mod_time_str}]"
-                    
-                    # Добавляем в начало списка
-                    display_tasks.append([current_task, display_task])
-                    # Удаляем из словаря, чтобы не дублировать
-                    del tasks_info[current_task]
-            except:
-                pass
-            
-            # Добавляем остальные задачи
-            for task_name, info in sorted(tasks_info.items()):
-                # Форматируем время последней модификации
-                if info['mod_time'] > 0:
-                    mod_time_str = datetime.fromtimestamp(info['mod_time']).strftime('%d.%m.%Y %H:%M')
-                else:
-                    mod_time_str = "неизвестно"
-                
-                # Формируем строку для отображения
-                sites_str = ", ".join(sorted(info['sites']))
-                if len(sites_str) > 20:
-                    sites_str = sites_str[:17] + "..."
-                
-                # Добавляем задачу с дополнительной информацией
-                display_task = f"{task_name} [{info['file_count']} файлов, {mod_time_str}]"
-                
-                # Сохраняем оригинальное имя задачи в первом элементе списка,
-                # чтобы использовать его при выборе
-                display_tasks.append([task_name, display_task])
-            
-            # Всегда добавляем опцию "Создать новую задачу" в начало списка
-            display_tasks.insert(0, ["__new__", f"✚ Создать новую задачу для {site_folder}..."])
+            # Информация о задачах сайта берется из индекса задач
+            tasks_info = self._get_catalog(backup_root).get_tasks(site_folder)
             
-            return display_tasks
+            return self._format_task_list(tasks_info, f"✚ Создать новую задачу для {site_folder}...")
             
         except Exception as e:
             print(f"Ошибка при получении списка задач проекта: {str(e)}")
             return []
     
+    def _get_catalog(self, backup_root):
+        """
+        Возвращает каталог бэкапов с индексом задач
+        Если индекс еще не построен (первый запуск), он строится по содержимому папки
+        """
+        catalog = ftp_backup_catalog.get_catalog(backup_root)
+        if not catalog.has_task_index():
+            catalog.rebuild_tasks()
+        return catalog
+    
+    def _format_task_list(self, tasks_info, new_task_caption):
+        """
+        Преобразует информацию о задачах в список для отображения
+        Текущая задача выводится первой, перед ней - опция создания новой задачи
+        """
+        display_tasks = []
+        
+        # Добавляем текущую задачу в начало списка, если она существует
+        try:
+            current_task = ftp_backup.CURRENT_TASK_NUMBER
+            if current_task and current_task in tasks_info:
+                info = tasks_info.pop(current_task)
+                display_tasks.append([current_task, f"★ {current_task} [{info['file_count']} файлов, {self._format_mod_time(info)}]"])
+        except:
+            pass
+        
+        # Добавляем остальные задачи
+        for task_name, info in sorted(tasks_info.items()):
+            # Сохраняем оригинальное имя задачи в первом элементе списка,
+            # чтобы использовать его при выборе
+            display_tasks.append([task_name, f"{task_name} [{info['file_count']} файлов, {self._format_mod_time(info)}]"])
+        
+        # Всегда добавляем опцию "Создать новую задачу" в начало списка
+        display_tasks.insert(0, ["__new__", new_task_caption])
+        
+        return display_tasks
+    
+    def _format_mod_time(self, info):
+        """Форматирует время последней модификации задачи"""
+        if info['mod_time'] > 0:
+            return datetime.fromtimestamp(info['mod_time']).strftime('%d.%m.%Y %H:%M')
+        return "неизвестно"
+    
     def _find_site_folder(self, backup_root, site_name):
         """
         Поиск папки сайта в корневой директории бэкапов
@@ -248,12 +278,10 @@ class TaskSelectorHelper:
                 return safe_site_name
             
             # Пробуем найти по части имени
-            for folder in os.listdir(backup_root):
-                folder_path = os.path.join(backup_root, folder)
-                if os.path.isdir(folder_path) and folder != "logs":
-                    # Проверяем, является ли эта папка точным совпадением
-                    if folder.lower() == site_name.lower():
-                        return folder
+            for folder in ftp_backup_scanner.list_subdirs(backup_root, skip=ftp_backup_scanner.SERVICE_FOLDERS):
+                # Проверяем, является ли эта папка точным совпадением
+                if folder.lower() == site_name.lower():
+                    return folder
             
             # Ничего не найдено
             return None
@@ -264,7 +292,7 @@ class TaskSelectorHelper:
     
     def get_all_tasks(self):
         """
-        Получает список всех доступных задач из папки бэкапов
+        Получает список всех доступных задач из индекса задач
         Возвращает список строк с именами задач и дополнительной информацией
         """
         try:
@@ -275,116 +303,10 @@ class TaskSelectorHelper:
             if not backup_root or not os.path.exists(backup_root):
                 return []
             
-            # Словарь для хранения информации о задачах
-            # Ключ - имя задачи, значение - словарь с информацией
-            tasks_info = {}
-            
-            # Ищем задачи во всех подпапках
-            for site_folder in os.listdir(backup_root):
-                site_path = os.path.join(backup_root, site_folder)
-                
-                # Игнорируем папку логов и файлы
-                if not os.path.isdir(site_path) or site_folder == 'logs':
-                    continue
-                
-                # Проверяем подпапки сайта (месяцы или задачи)
-                for month_folder in os.listdir(site_path):
-                    month_path = os.path.join(site_path, month_folder)
-                    
-                    if not os.path.isdir(month_path):
-                        continue
-                    
-                    # Ищем задачи в папке месяца
-                    for item in os.listdir(month_path):
-                        item_path = os.path.join(month_path, item)
-                        
-                        # Проверяем является ли папка задачей
-                        # Задача обычно имеет имя, начинающееся с task_ или это папка, не являющаяся before/after
-                        if os.path.isdir(item_path) and item not in ['before', 'after', 'logs']:
-                            # Если задача еще не в словаре, добавляем её
-                            if item not in tasks_info:
-                                tasks_info[item] = {
-                                    'name': item,
-                                    'sites': set(),  # Сайты, где используется задача
-                                    'file_count': 0,  # Общее количество файлов
-                                    'mod_time': 0,    # Время последней модификации
-                                    'paths': []       # Пути к папкам задачи
-                                }
-                            
-                            # Добавляем информацию о сайте
-                            tasks_info[item]['sites'].add(site_folder)
-                            
-                            # Добавляем путь к папке задачи
-                            tasks_info[item]['paths'].append(item_path)
-                            
-                            # Подсчитываем файлы и проверяем время модификации
-                            for root, dirs, files in os.walk(item_path):
-                                tasks_info[item]['file_count'] += len(files)
-                                
-                                # Проверяем время модификации каждого файла
-                                for file in files:
-                                    file_path = os.path.join(root, file)
-                                    try:
-                                        mtime = os.path.getmtime(file_path)
-                                        if mtime > tasks_info[item]['mod_time']:
-                                            tasks_info[item]['mod_time'] = mtime
-                                    except:
-                                        pass
-            
-            # Преобразуем информацию о задачах в список для отображения
-            display_tasks = []
-            
-            # Добавляем текущую задачу в начало списка, если она существует
-            try:
-                current_task = ftp_backup.CURRENT_TASK_NUMBER
-                if current_task and current_task in tasks_info:
-                    info = tasks_info[current_task]
-                    
-                    # Форматируем время последней модификации
-                    if info['mod_time'] > 0:
-                        mod_time_str = datetime.fromtimestamp(info['mod_time']).strftime('%d.%m.%Y %H:%M')
-                    else:
-                        mod_time_str = "неизвестно"
-                    
-                    # Формируем строку для отображения
-                    sites_str = ", ".join(sorted(info['sites']))
-                    if len(sites_str) > 20:
-                        sites_str = sites_str[:17] + "..."
-                    
-                    # Добавляем задачу с дополнительной информацией
-                    display_task = f"★ {current_task} [{info['file_count']} файлов, {mod_time_str}]"
-                    
-                    # Добавляем в начало списка
-                    display_tasks.append([current_task, display_task])
-                    # Удаляем из словаря, чтобы не дублировать
-                    del tasks_info[current_task]
-            except:
-                pass
-            
-            # Добавляем остальные задачи
-            for task_name, info in sorted(tasks_info.items()):
-                # Форматируем время последней модификации
-                if info['mod_time'] > 0:
-                    mod_time_str = datetime.fromtimestamp(info['mod_time']).strftime('%d.%m.%Y %H:%M')
-                else:
-                    mod_time_str = "неизвестно"
-                
-                # Формируем строку для отображения
-                sites_str = ", ".join(sorted(info['sites']))
-                if len(sites_str) > 20:
-                    sites_str = sites_str[:17] + "..."
-                
-                # Добавляем задачу с дополнительной информацией
-                display_task = f"{task_name} [{info['file_count']} файлов, {mod_time_str}]"
-                
-                # Сохраняем оригинальное имя задачи в первом элементе списка,
-                # чтобы использовать его при выборе
-                display_tasks.append([task_name, display_task])
-            
-            # Всегда добавляем опцию "Создать новую задачу" в начало списка
-            display_tasks.insert(0, ["__new__", "✚ Создать новую задачу..."])
+            # Задачи всех сайтов объединяются по имени
+            tasks_info = self._get_catalog(backup_root).get_tasks()
             
-            return display_tasks
+            return self._format_task_list(tasks_info, "✚ Создать новую задачу...")
             
         except Exception as e:
             print(f"Ошибка при получении списка задач: {str(e)}")
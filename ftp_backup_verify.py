@@ -0,0 +1,246 @@
+import sublime
+import sublime_plugin
+import os
+import json
+import zipfile
+import tarfile
+import concurrent.futures
+from datetime import datetime
+
+# Подключение к движку архивации FTP Backup
+try:
+    from . import ftp_backup_archive
+except ImportError:
+    import ftp_backup_archive
+
+# Общий сканер папок бэкапов
+try:
+    from . import ftp_backup_scanner
+except ImportError:
+    import ftp_backup_scanner
+
+# Размер блока при чтении файлов из архива
+READ_CHUNK_SIZE = 1024 * 1024
+
+def detect_archive_format(archive_path):
+    """Определяет формат архива по расширению"""
+    for archive_format, extension in ftp_backup_archive.ARCHIVE_FORMATS.items():
+        if archive_path.endswith(extension):
+            return archive_format
+    return None
+
+def load_archive_manifest(archive_path):
+    """Загружает манифест архива, если он был сохранен при создании"""
+    manifest_path = ftp_backup_archive.get_archive_manifest_path(archive_path)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('files', {})
+
+def _read_zip_members(archive_path, names):
+    """
+    Читает указанные файлы ZIP до конца: zipfile сверяет CRC при достижении конца файла.
+    Каждый поток открывает архив отдельно, поэтому чтение идет параллельно
+    """
+    errors = []
+    with zipfile.ZipFile(archive_path, 'r') as zipf:
+        for name in names:
+            try:
+                with zipf.open(name) as member:
+                    while member.read(READ_CHUNK_SIZE):
+                        pass
+            except Exception as e:
+                errors.append(f"CRC: {name} ({e})")
+    return errors
+
+def _verify_zip(archive_path, max_workers):
+    """Проверяет CRC всех файлов ZIP параллельно и возвращает (размеры файлов, ошибки)"""
+    with zipfile.ZipFile(archive_path, 'r') as zipf:
+        infos = [info for info in zipf.infolist() if not info.is_dir()]
+    members = {info.filename: info.file_size for info in infos}
+
+    names = list(members)
+    chunk_count = max(1, min(max_workers, len(names)))
+    chunks = [names[i::chunk_count] for i in range(chunk_count)]
+
+    errors = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=chunk_count) as executor:
+        for chunk_errors in executor.map(lambda chunk: _read_zip_members(archive_path, chunk), chunks):
+            errors.extend(chunk_errors)
+    return members, errors
+
+def _verify_tar(archive_path):
+    """
+    Последовательно читает tar-поток: gzip и xz проверяют контрольные суммы
+    сжатого потока, поэтому повреждение обнаруживается при чтении
+    """
+    members = {}
+    errors = []
+    try:
+        with tarfile.open(archive_path, 'r|*') as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                members[member.name] = member.size
+                source = tar.extractfile(member)
+                read_size = 0
+                while True:
+                    chunk = source.read(READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    read_size += len(chunk)
+                if read_size != member.size:
+                    errors.append(f"Поврежден: {member.name} (прочитано {read_size} из {member.size} байт)")
+    except Exception as e:
+        errors.append(f"Ошибка чтения потока: {e}")
+    return members, errors
+
+def verify_archive(archive_path, max_workers=None):
+    """
+    Проверяет архив: читает все файлы (CRC для ZIP, контрольные суммы потока для tar)
+    и сравнивает количество и размеры файлов с манифестом источника.
+    Возвращает словарь с результатами проверки
+    """
+    if max_workers is None:
+        max_workers = min(4, os.cpu_count() or 1)
+
+    result = {
+        'archive': archive_path,
+        'members': 0,
+        'expected': None,
+        'errors': []
+    }
+
+    archive_format = detect_archive_format(archive_path)
+    try:
+        if archive_format == 'zip':
+            members, errors = _verify_zip(archive_path, max_workers)
+        elif archive_format:
+            members, errors = _verify_tar(archive_path)
+        else:
+            result['errors'].append("Неизвестный формат архива")
+            return result
+    except Exception as e:
+        result['errors'].append(f"Архив не читается: {e}")
+        return result
+
+    result['members'] = len(members)
+    result['errors'].extend(errors)
+
+    try:
+        manifest = load_archive_manifest(archive_path)
+    except Exception as e:
+        manifest = None
+        result['errors'].append(f"Манифест не читается: {e}")
+
+    if manifest is not None:
+        result['expected'] = len(manifest)
+        for name, size in manifest.items():
+            if name not in members:
+                result['errors'].append(f"Нет в архиве: {name}")
+            elif members[name] != size:
+                result['errors'].append(f"Размер: {name} (архив {members[name]}, источник {size} байт)")
+        for name in members:
+            if name not in manifest:
+                result['errors'].append(f"Лишний файл: {name}")
+
+    return result
+
+def verify_archives(archive_paths, max_workers=None):
+    """Проверяет несколько архивов (например, тома) параллельно"""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(4, len(archive_paths)))) as executor:
+        return list(executor.map(lambda path: verify_archive(path, max_workers), archive_paths))
+
+def format_verify_report(results):
+    """Формирует текст отчета о проверке для панели вывода"""
+    lines = [f"Проверка архивов: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}"]
+    for result in results:
+        lines.append("")
+        lines.append(f"Архив: {result['archive']}")
+        if result['expected'] is None:
+            lines.append(f"Файлов в архиве: {result['members']} (манифест не найден)")
+        else:
+            lines.append(f"Файлов в архиве: {result['members']}, в манифесте: {result['expected']}")
+
+        if result['errors']:
+            lines.append(f"❌ Найдено проблем: {len(result['errors'])}")
+            for error in result['errors']:
+                lines.append(f"   {error}")
+        else:
+            lines.append("✅ Архив исправен")
+    return "\n".join(lines) + "\n"
+
+def find_archives(backup_root):
+    """
+    Ищет архивы в корневой папке бэкапов, начиная с самых новых.
+    Папки before/after не просматриваются: архивы в них не создаются
+    """
+    skip_folders = ('before', 'after', 'logs', 'reports')
+    archives = [
+        (record.mtime, record.path)
+        for record in ftp_backup_scanner.iter_files(backup_root, exclude=lambda name, relpath: name in skip_folders)
+        if record.name.startswith('backup_') and detect_archive_format(record.name)
+    ]
+    archives.sort(reverse=True)
+    return [path for _, path in archives]
+
+class FtpBackupVerifyArchiveCommand(sublime_plugin.WindowCommand):
+    """Проверка целостности архивов в фоновом потоке"""
+
+    def run(self, archive_paths=None, quiet=False):
+        """
+        archive_paths: список архивов; если не указан, предлагается выбрать архив
+        quiet: показывать панель только при найденных проблемах (автоматическая проверка)
+        """
+        if archive_paths:
+            self.start_verification(archive_paths, quiet)
+            return
+
+        settings = sublime.load_settings('ftp_backup.sublime-settings')
+        backup_root = settings.get('backup_root')
+        if not backup_root or not os.path.exists(backup_root):
+            sublime.status_message("FTP Backup: Папка для бэкапов не найдена")
+            return
+
+        self.archives = find_archives(backup_root)
+        if not self.archives:
+            sublime.status_message("FTP Backup: Архивы не найдены")
+            return
+
+        items = [[os.path.basename(path), os.path.dirname(os.path.relpath(path, backup_root))] for path in self.archives]
+        self.window.show_quick_panel(items, self.on_archive_selected)
+
+    def on_archive_selected(self, index):
+        if index == -1:
+            return
+        self.start_verification([self.archives[index]])
+
+    def start_verification(self, archive_paths, quiet=False):
+        """
+        Запускает проверку в фоне, чтобы не блокировать интерфейс.
+        quiet передается в фоновую проверку аргументом: команда может быть запущена повторно до ее завершения
+        """
+        sublime.status_message(f"FTP Backup: Проверка архивов ({len(archive_paths)})...")
+        sublime.set_timeout_async(lambda: self.verify(archive_paths, quiet), 0)
+
+    def verify(self, archive_paths, quiet):
+        try:
+            results = verify_archives(archive_paths)
+            report = format_verify_report(results)
+            failed = sum(1 for result in results if result['errors'])
+        except Exception as e:
+            report = f"Ошибка проверки архивов: {e}\n"
+            failed = len(archive_paths)
+
+        sublime.set_timeout(lambda: self.show_report(report, failed, quiet), 0)
+
+    def show_report(self, report, failed, quiet):
+        """Показывает результат проверки в панели вывода"""
+        panel = self.window.create_output_panel("ftp_backup_verify")
+        panel.run_command("append", {"characters": report, "scroll_to_end": True})
+        if failed or not quiet:
+            self.window.run_command("show_panel", {"panel": "output.ftp_backup_verify"})
+        if failed:
+            sublime.status_message(f"FTP Backup: ❌ Проблемы в архивах: {failed}")
+        else:
+            sublime.status_message("FTP Backup: ✅ Архивы проверены, ошибок нет")
@@ -0,0 +1,47 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ftp_backup_scanner
+
+
+class IterBackupCopiesTest(unittest.TestCase):
+    """Служебные папки пропускаются только в корне бэкапов"""
+
+    def setUp(self):
+        self.backup_root = tempfile.mkdtemp()
+        task_path = os.path.join(self.backup_root, 'example.com', 'October 2024', 'task')
+        for relpath in ('before/app/index.php', 'before/app/logs/error.log', 'after/app/logs/error.log'):
+            self.write(os.path.join(task_path, relpath))
+        self.write(os.path.join(self.backup_root, 'logs', 'before', 'plugin.log'))
+        self.write(os.path.join(self.backup_root, 'snapshots', 'example.com', 'before', 'index.php'))
+
+    def tearDown(self):
+        shutil.rmtree(self.backup_root)
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write('content')
+
+    def test_nested_logs_folder_is_kept(self):
+        copies = sorted((info['kind'], info['relative_path'])
+                        for _, info in ftp_backup_scanner.iter_backup_copies(self.backup_root))
+        self.assertEqual(copies, [
+            ('after', 'app/logs/error.log'),
+            ('before', 'app/index.php'),
+            ('before', 'app/logs/error.log')
+        ])
+
+    def test_copies_match_task_scan(self):
+        tasks = ftp_backup_scanner.scan_tasks(self.backup_root, max_workers=1)
+        copies = list(ftp_backup_scanner.iter_backup_copies(self.backup_root))
+        self.assertEqual(sum(task.file_count for task in tasks), len(copies))
+
+
+if __name__ == '__main__':
+    unittest.main()